@@ -1,51 +1,110 @@
 import time
-from pynput import keyboard
-import mss
 import numpy as np
-from pynput.keyboard import Key, Controller
 import os
-import psutil
 import random
 import logging
-import importlib
 import re
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Optional, Tuple
 
-# Optional OCR deps
-try:
-    from PIL import Image, ImageOps, ImageFilter
-except Exception:
-    Image = None  # type: ignore[assignment]
-    ImageOps = None  # type: ignore[assignment]
-    ImageFilter = None  # type: ignore[assignment]
-try:
-    import pytesseract
-except Exception:
-    pytesseract = None  # type: ignore[assignment]
-
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-
-# Try to access mouse controller; provide a Windows fallback if unavailable
-try:
-    _pynput_mouse = importlib.import_module("pynput.mouse")
-    Button = _pynput_mouse.Button  # type: ignore[attr-defined]
-    MouseController = _pynput_mouse.Controller  # type: ignore[attr-defined]
-except Exception:
-    Button = None  # type: ignore[assignment]
-    MouseController = None  # type: ignore[assignment]
-    import ctypes
-    MOUSEEVENTF_LEFTDOWN = 0x0002
-    MOUSEEVENTF_LEFTUP = 0x0004
-    def _win_left_click(x: int, y: int) -> None:
-        ctypes.windll.user32.SetCursorPos(int(x), int(y))
-        ctypes.windll.user32.mouse_event(MOUSEEVENTF_LEFTDOWN, 0, 0, 0, 0)
-        ctypes.windll.user32.mouse_event(MOUSEEVENTF_LEFTUP, 0, 0, 0, 0)
-
-
+from calibrate import use_calibrated_window
+from debug_writer import DebugWriter
+from deps import LazyModule, capabilities, tesseract
+from input_backend import get_injector
+from metrics import get_metrics
+from ocr import OcrCache, load_digit_recognizer, tesseract_number
+from screen import ChangeDetector, Probe, get_engine, to_pil_rgb
+from screen_index import Match, load_screen_index
+from screen_state import UNKNOWN, load_screen_classifier
+from trophy_estimator import TrophyEstimator
+
+# Optional dependencies, imported on first use (see deps.py). keyboard is the
+# quit-key listener; it is falsy without pynput or a display (e.g. headless runs)
+keyboard = LazyModule("pynput.keyboard")
+psutil = LazyModule("psutil")
 
 # Flag to control the monitoring loop
 running = True
 
+# Allowed per-channel colour difference for pixel checks; absorbs
+# compression/gamma drift such as (247, 13, 22) vs (247, 13, 23)
+COLOR_TOLERANCE = 3
+
+# Upper bounds (seconds) on the long waits so a missed colour never hangs the bot.
+# No known screen for SCREEN_TIMEOUT means a pop-up or menu is in the way, and
+# a click should move the game off its current screen within CHANGE_TIMEOUT
+SCREEN_TIMEOUT = 120
+SEARCH_TIMEOUT = 60
+BATTLE_TIMEOUT = 240
+CHANGE_TIMEOUT = 15
+
+# Native trophy digit templates, built with `python ocr.py build`; None falls back to tesseract
+DIGITS = load_digit_recognizer(os.path.join(os.path.dirname(os.path.abspath(__file__)), "trophy_digits.npz"))
+
+# OCR results keyed by the trophy box pixels; identical pixels are never re-read
+OCR_CACHE = OcrCache(maxsize=32)
+
+# OCR debug captures: "off", "failure" or "always"; written to debug_ocr/ off the main thread
+DEBUG_IMAGES = DebugWriter("debug_trophy_ocr_dropper", mode="failure")
+
+# Trophy counter on the home screen: (left, top, right, bottom)
+TROPHY_BBOX = (140, 165, 240, 200)
+
+# The trophy counter animates in after the home screen loads; it is read only
+# once it has stopped changing
+TROPHY_VIEW = ChangeDetector((TROPHY_BBOX[0], TROPHY_BBOX[1], TROPHY_BBOX[2] - TROPHY_BBOX[0],
+                              TROPHY_BBOX[3] - TROPHY_BBOX[1]), step=2, threshold=2.0)
+SETTLE_TIMEOUT = 3
+
+# Trophies lost per surrender, (fewest, most). The count is carried forward
+# with this between reads, and only read again every OCR_EVERY battles or
+# once the lowest possible count reaches the target (see trophy_estimator.py)
+TROPHY_LOSS = (5, 20)
+OCR_EVERY = 10
+
+# Screens the loops branch on, told apart by their sentinel pixels and, once
+# screen_signatures.npz has been built with `python screen_state.py build`,
+# by whole-screen fingerprints as well
+SCREENS = load_screen_classifier(os.path.join(os.path.dirname(os.path.abspath(__file__)), "screen_signatures.npz"), {
+    "home": [Probe((77, 35), (33, 221, 255), tolerance=COLOR_TOLERANCE)],
+    "searching": [Probe((1, 1), (234, 239, 244), tolerance=COLOR_TOLERANCE)],
+    "battle": [Probe((161, 776), (247, 13, 23), tolerance=COLOR_TOLERANCE)],
+    "one_star": [Probe((161, 776), (247, 13, 23), tolerance=COLOR_TOLERANCE),
+                 Probe((1629, 809), (196, 200, 194), tolerance=COLOR_TOLERANCE)],
+    "results": [Probe((900, 955), (108, 187, 31), tolerance=COLOR_TOLERANCE)],
+})
+
+# The screens the main loop branches on. Any other screen the classifier knows
+# (attack_menu, army, ... once signatures are built) is waited out like an
+# unknown one and then backed out of
+LOOP_STATES = ("home", "searching", "battle", "one_star", "results")
+
+# Middle of the screen, watched for the search clouds clearing; a found base
+# changes it far more than drifting clouds do
+SEARCH_VIEW = ChangeDetector((480, 270, 960, 540), step=8, threshold=25.0)
+
+# Perceptual hashes of screens and pop-ups, built with `python screen_index.py build`;
+# names whatever is in the way when no known screen shows
+SCREEN_INDEX = load_screen_index(os.path.join(os.path.dirname(os.path.abspath(__file__)), "screen_index"))
+
+# Index labels of screens the loop does not branch on, and the box (x0, x1, y0, y1)
+# to click to move each one along; any other screen is backed out of with Escape
+RECOVERY_CLICKS = {
+    "attack_menu": (1250, 1500, 600, 650),
+    "surrender_confirm": (1000, 1300, 650, 750),
+}
+
+# Find the game window by its anchors (see calibrate.py) instead of assuming the
+# 1920x1080 layout at the top-left of the desktop; the fit is cached per window
+# geometry. WINDOW holds the calibrated window, here or under supervisor.py
+CALIBRATE = False
+WINDOW = None
+
+# Per-phase timing snapshot, e.g. "metrics.json" or "metrics.prom" (Prometheus
+# textfile), rewritten every minute; None leaves the timers switched off
+METRICS_FILE: Optional[str] = None
+METRICS = get_metrics()
+
 # Flag for if OCR failed on last, to allow if a certain number is bad
 last_ocr_failed = False
 
@@ -64,74 +123,67 @@ def click_after_random_delay(x: int, y: int) -> None:
     """Wait 1000-3000 ms randomly, then left-click at screen coordinate (x, y)."""
     delay_ms = random.randint(1000, 2000)
     time.sleep(delay_ms / 1000.0)
-    if MouseController is not None and Button is not None:
-        mouse = MouseController()
-        mouse.position = (x, y)
-        mouse.click(Button.left, 1)
-    else:
-        # Fallback for Windows when pynput.mouse is unavailable
-        try:
-            _win_left_click(x, y)  # type: ignore[name-defined]
-        except Exception as e:
-            print(f"Mouse click failed: {e}")
+    get_injector().click(x, y)
 
 
 def _ocr_number_from_region(bbox: Tuple[int, int, int, int], required_digits: Optional[int] = None) -> Optional[int]:
-    """OCR a number from screen region with minimal preprocessing"""
+    """OCR a number from screen region, skipping the OCR if these exact pixels were read before"""
     left, top, right, bottom = bbox
     width, height = right - left, bottom - top
 
-    with mss.mss() as sct:
-        shot = sct.grab({"left": left, "top": top, "width": width, "height": height})
-    
-    # Convert to PIL RGB
-    arr = np.asarray(shot)[:, :, :3][:, :, ::-1]
-    img = Image.fromarray(arr)
-    
-    # Minimal preprocessing - just upscale
-    img = img.resize((img.width * 4, img.height * 4), Image.LANCZOS)
-    
-    # Save debug image
-    img.save("debug_trophy_ocr_dropper.png")
-    print(f"Debug: Saved OCR region to debug_trophy_ocr_dropper.png")
-    
-    # Simple OCR configs to try
-    configs = [
-        "--oem 3 --psm 8 -c tessedit_char_whitelist=0123456789",
-        "--oem 3 --psm 7 -c tessedit_char_whitelist=0123456789", 
-        "--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789"
-    ]
+    shot = get_engine().grab((left, top, width, height))
+    return _ocr_number_from_shot(shot, required_digits)
+
+
+def _ocr_number_from_shot(shot: np.ndarray, required_digits: Optional[int] = None) -> Optional[int]:
+    """OCR an already captured region; safe to run off the main thread"""
+    value = OCR_CACHE.lookup(shot, required_digits, lambda: _read_number(shot, required_digits))
+    logging.debug(f"OCR cache: {OCR_CACHE.stats()}")
+    # Saved on a background thread; only failures are kept by default
+    DEBUG_IMAGES.submit(shot, failed=value is None, tag=str(value))
+    return value
+
+
+def _read_number(shot: np.ndarray, required_digits: Optional[int] = None) -> Optional[int]:
+    """Native digit matcher first, then tesseract"""
+    # Fast path: template-match the fixed trophy font
+    if DIGITS is not None:
+        value = DIGITS.read(shot, required_digits)
+        if value is not None:
+            return value
     
-    for config in configs:
-        try:
-            text = pytesseract.image_to_string(img, config=config).strip()
-            
-            # Extract number
-            match = re.search(r'\d+', text)
-            if match:
-                value = int(match.group())
-                digits = len(str(value))
-                
-                if required_digits is None or digits == required_digits:
-                    return value
-        except Exception as e:
-            print(f"OCR failed with config {config}: {e}")
-            continue
+    # Tesseract fallback, on hosts that have it
+    if tesseract() is not None:
+        from PIL import Image
+
+        # Convert to PIL RGB straight from the BGRA buffer
+        img = to_pil_rgb(shot)
+
+        # Minimal preprocessing - just upscale
+        img = img.resize((img.width * 4, img.height * 4), Image.LANCZOS)
+
+        value = tesseract_number(img, required_digits)
+        if value is not None:
+            return value
     
     print("All OCR attempts failed")
 
     return None
 
 
-def trophies_under(target: int, required_digits: int = 4) -> bool:
+def trophies_under(target: int, required_digits: int = 4, shot: Optional[np.ndarray] = None,
+                   estimator: Optional[TrophyEstimator] = None) -> bool:
     global last_ocr_failed
     """Capture the box, OCR a number, return True if it's under target.
 
     required_digits: number of digits the OCR result must have (default 4)
+    shot: trophy box pixels captured earlier (see start_trophy_check); grabbed now if None
+    estimator: reset to the value read, if given
     """
-    # Hard-coded rectangle: (left, top, right, bottom)
-    bbox = (140, 165, 240, 200)
-    value = _ocr_number_from_region(bbox, required_digits=required_digits)
+    if shot is None:
+        value = _ocr_number_from_region(TROPHY_BBOX, required_digits=required_digits)
+    else:
+        value = _ocr_number_from_shot(shot, required_digits=required_digits)
     if value is None:
         print("OCR failed to read the trophy count.")
         if (not last_ocr_failed):
@@ -139,60 +191,60 @@ def trophies_under(target: int, required_digits: int = 4) -> bool:
             return False
         return True
     print(f"OCR saw: {value}")
+    if estimator is not None:
+        estimator.observe(value)
     return value < int(target)
 
 
-def wait_until_pixel_not_color(expected_rgb: Tuple[int, int, int], point: Tuple[int, int]) -> bool:
-    """Wait until pixel (1,1) is no longer exactly expected_rgb.
+def start_trophy_check(pool: ThreadPoolExecutor, target: int, required_digits: int = 4,
+                       estimator: Optional[TrophyEstimator] = None) -> "Future[bool]":
+    """Grab the trophy box now and OCR it on pool while the bot keeps clicking."""
+    left, top, right, bottom = TROPHY_BBOX
+    shot = get_engine().grab((left, top, right - left, bottom - top))
+    return pool.submit(trophies_under, target, required_digits, shot, estimator)
 
-    Returns True when the pixel changes
-    """
-    poll_interval: float = 0.05
 
+def recover_to_home() -> None:
+    """Back out of an unrecognised screen; Escape closes menus and pop-ups in the game."""
+    if not keyboard:
+        return
     try:
-        with mss.mss() as sct:
-            while True:
-                shot = sct.grab({"left": point[0], "top": point[1], "width": 1, "height": 1})
-                # mss returns BGRA
-                b, g, r, _ = np.array(shot)[0, 0]
-                rgb = (int(r), int(g), int(b))
-                if rgb != expected_rgb:
-                    return True
-                time.sleep(poll_interval)
+        controller = keyboard.Controller()
+        controller.press(keyboard.Key.esc)
+        controller.release(keyboard.Key.esc)
     except Exception as e:
-        print(f"Pixel check failed: {e}")
-        return False
-    
-def wait_until_pixel_color(expected_rgb: Tuple[int, int, int], point: Tuple[int, int]) -> bool:
-    """Wait until pixel (1,1) is no longer exactly expected_rgb.
+        print(f"Could not send Escape: {e}")
 
-    Returns True when the pixel changes
-    """
-    poll_interval: float = 0.05
 
-    try:
-        with mss.mss() as sct:
-            while True:
-                shot = sct.grab({"left": point[0], "top": point[1], "width": 1, "height": 1})
-                # mss returns BGRA
-                b, g, r, _ = np.array(shot)[0, 0]
-                rgb = (int(r), int(g), int(b))
-                if rgb == expected_rgb:
-                    return True
-                time.sleep(poll_interval)
-    except Exception as e:
-        print(f"Pixel check failed: {e}")
-        return False
+def back_out(blocker: Optional[Match]) -> None:
+    """Move off a screen the loop does not branch on: click it along if the
+    screen index named it in RECOVERY_CLICKS, otherwise recover_to_home()."""
+    box = RECOVERY_CLICKS.get(blocker.label) if blocker is not None else None
+    if box is None:
+        recover_to_home()
+        return
+    x0, x1, y0, y1 = box
+    click_after_random_delay(random.randint(x0, x1), random.randint(y0, y1))
 
 
 def main():
+    logging.info(f"Capabilities: {capabilities()}")
+
+    # Every drop decision rests on reading the trophy count
+    if DIGITS is None and tesseract() is None:
+        print("Cannot read trophies: build trophy_digits.npz with `python ocr.py build` or install tesseract")
+        return
+
     # Increase the script's process priority to high
-    try:
-        p = psutil.Process(os.getpid())
-        p.nice(psutil.HIGH_PRIORITY_CLASS)
-    except (psutil.NoSuchProcess, psutil.AccessDenied) as e:
-        print(f"Could not set process priority: {e}")
-        logging.warning(f"Could not set process priority: {e}")
+    if psutil:
+        try:
+            p = psutil.Process(os.getpid())
+            p.nice(psutil.HIGH_PRIORITY_CLASS)
+        except (psutil.NoSuchProcess, psutil.AccessDenied, AttributeError) as e:
+            print(f"Could not set process priority: {e}")
+            logging.warning(f"Could not set process priority: {e}")
+    else:
+        print("psutil not installed; running at normal priority")
 
     print("What trophies do you want to drop to?")
     target_input = input()
@@ -210,43 +262,116 @@ def main():
     print(f"Dropping to {target} trophies, press 'q' to quit.")
 
     # Start a keyboard listener in a separate thread to listen for the quit command
-    listener = keyboard.Listener(on_press=on_press)
-    listener.start()
-    keyboard_controller = Controller()
-
-    # util func
-
-
-    with mss.mss() as sct:
-        while running:
-            wait_until_pixel_color((33, 221, 255), (77, 35))
-            time.sleep(2)
-            if (trophies_under(target)):
-                print(f"Exiting script as trophies are below {target}.")
-                exit(0)
-            # Click attack
-            click_after_random_delay(random.randint(75, 175), random.randint(900, 1000))
-            # Click find match
-            click_after_random_delay(random.randint(1250, 1500), random.randint(600, 650))
-            # Wait for base to be found
-            time.sleep(2)
-            wait_until_pixel_not_color((234, 239, 244), (1, 1))
-            wait_until_pixel_color((247, 13, 23), (161, 776))
-            # Select troop
-            click_after_random_delay(random.randint(160, 260), random.randint(920, 1040))
-            # Place Troop
-            rand = random.randint(1, 2)
-            if (rand == 1):
-                click_after_random_delay(random.randint(1230, 1250), random.randint(140, 150))
+    listener = None
+    if keyboard:
+        listener = keyboard.Listener(on_press=on_press)
+        listener.start()
+
+    global WINDOW
+    if CALIBRATE and WINDOW is None:
+        WINDOW = use_calibrated_window()
+
+    # Create the mouse backend and its injection thread up front
+    injector = get_injector()
+    print(f"Mouse input via {injector.backend.name}")
+
+    # Trophy OCR runs here, overlapped with the navigation clicks
+    ocr_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trophy-ocr")
+    trophies = TrophyEstimator(TROPHY_LOSS, OCR_EVERY)
+
+    if METRICS_FILE:
+        METRICS.enable(METRICS_FILE)
+
+    # Branch on whichever screen is showing rather than assuming the next
+    # one, so slow loads are waited out and stray pop-ups are backed out of
+    trophy_check = None
+    while running:
+        with METRICS.phase("detect"):
+            seen = SCREENS.wait_state(LOOP_STATES, timeout=SCREEN_TIMEOUT, max_interval=0.5)
+        METRICS.observe("wait", "screen", seen.elapsed)
+        if not seen.ok:
+            blocker = SCREEN_INDEX.identify() if SCREEN_INDEX is not None else None
+            if (blocker is None or blocker.label == UNKNOWN) and seen.value.state != UNKNOWN:
+                # The classifier named a screen the loop does not branch on
+                blocker = Match(seen.value.state, 0)
+            print(f"No known screen for {seen.elapsed:.0f}s"
+                  + (f" ({blocker.label}, {blocker.distance} bits)" if blocker else "") + ", backing out")
+            back_out(blocker)
+            if WINDOW is not None:
+                # A moved or resized window looks the same as an unknown screen
+                WINDOW.ensure()
+            continue
+        state = seen.value.state
+        logging.debug(f"Screen: {state} (distance {seen.value.distance:.1f})")
+
+        if state == "home":
+            # A read left over from an earlier pass must not decide this battle
+            trophy_check = None
+            if trophies.needs_read(target):
+                with METRICS.phase("ocr_wait"):
+                    settled = TROPHY_VIEW.wait_stable(timeout=SETTLE_TIMEOUT, max_interval=0.1)
+                METRICS.observe("wait", "trophy_settle", settled.elapsed)
+                trophy_check = start_trophy_check(ocr_pool, target, estimator=trophies)
             else:
-                click_after_random_delay(random.randint(640, 660), random.randint(160, 175))
-            # Surrender
-            click_after_random_delay(random.randint(40, 220), random.randint(780, 830))
-            click_after_random_delay(random.randint(1000, 1300), random.randint(650, 750))
-            # Go home
-            click_after_random_delay(random.randint(850, 1050), random.randint(900, 950))
-
-
+                logging.debug(f"Trophies at least {trophies.low} (estimate {trophies.estimate}), OCR skipped")
+            with METRICS.phase("matchmaking"):
+                # Click attack
+                click_after_random_delay(random.randint(75, 175), random.randint(900, 1000))
+                # Click find match
+                click_after_random_delay(random.randint(1250, 1500), random.randint(600, 650))
+                changed = SCREENS.wait_state(exclude=("home",), timeout=CHANGE_TIMEOUT, max_interval=0.5)
+                METRICS.observe("wait", "leave_home", changed.elapsed)
+        elif state == "searching":
+            # Wait for base to be found, then for the clouds to finish clearing
+            with METRICS.phase("matchmaking"):
+                found = SEARCH_VIEW.wait_changed(timeout=SEARCH_TIMEOUT, max_interval=0.25)
+                METRICS.observe("wait", "search_clouds", found.elapsed)
+                if found.ok:
+                    settled = SEARCH_VIEW.wait_stable(timeout=CHANGE_TIMEOUT, max_interval=0.1)
+                    METRICS.observe("wait", "search_settle", settled.elapsed)
+        elif state in ("battle", "one_star"):
+            # Check the trophy read before committing troops
+            if trophy_check is not None:
+                with METRICS.phase("ocr_wait"):
+                    below_target = trophy_check.result()
+                trophy_check = None
+                if (below_target):
+                    print(f"Exiting script as trophies are below {target}.")
+                    DEBUG_IMAGES.flush()
+                    exit(0)
+            with METRICS.phase("deployment"):
+                # Select troop
+                click_after_random_delay(random.randint(160, 260), random.randint(920, 1040))
+                # Place Troop
+                rand = random.randint(1, 2)
+                if (rand == 1):
+                    click_after_random_delay(random.randint(1230, 1250), random.randint(140, 150))
+                else:
+                    click_after_random_delay(random.randint(640, 660), random.randint(160, 175))
+            with METRICS.phase("battle"):
+                # Surrender
+                click_after_random_delay(random.randint(40, 220), random.randint(780, 830))
+                click_after_random_delay(random.randint(1000, 1300), random.randint(650, 750))
+                # Counted here rather than on the results screen, which a
+                # timeout or recover_to_home can skip
+                trophies.record_loss()
+                changed = SCREENS.wait_state(exclude=("battle", "one_star"), timeout=CHANGE_TIMEOUT, max_interval=0.5)
+            METRICS.observe("wait", "surrender", changed.elapsed)
+        elif state == "results":
+            with METRICS.phase("return"):
+                # Go home
+                click_after_random_delay(random.randint(850, 1050), random.randint(900, 950))
+                changed = SCREENS.wait_state(exclude=("results",), timeout=CHANGE_TIMEOUT, max_interval=0.5)
+                METRICS.observe("wait", "leave_results", changed.elapsed)
+            METRICS.cycle_done()
+            logging.debug(f"Click latency: {injector.stats()}")
+
+
+    print(f"Trophy reads: {trophies.reads}, skipped: {trophies.skipped}")
+    DEBUG_IMAGES.flush()
+    if METRICS_FILE:
+        METRICS.write()
+    if listener is not None:
         listener.join()
 
 
@@ -1,51 +1,98 @@
 import time
-from pynput import keyboard
-import mss
 import numpy as np
-from pynput.keyboard import Key, Controller
 import os
-import psutil
 import random
 import logging
-import importlib
-import re
-from typing import Optional, Tuple
-
-# Optional OCR deps
-try:
-    from PIL import Image, ImageOps, ImageFilter
-except Exception:
-    Image = None  # type: ignore[assignment]
-    ImageOps = None  # type: ignore[assignment]
-    ImageFilter = None  # type: ignore[assignment]
-try:
-    import pytesseract
-except Exception:
-    pytesseract = None  # type: ignore[assignment]
-
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-
-# Try to access mouse controller; provide a Windows fallback if unavailable
-try:
-    _pynput_mouse = importlib.import_module("pynput.mouse")
-    Button = _pynput_mouse.Button  # type: ignore[attr-defined]
-    MouseController = _pynput_mouse.Controller  # type: ignore[attr-defined]
-except Exception:
-    Button = None  # type: ignore[assignment]
-    MouseController = None  # type: ignore[assignment]
-    import ctypes
-    MOUSEEVENTF_LEFTDOWN = 0x0002
-    MOUSEEVENTF_LEFTUP = 0x0004
-    def _win_left_click(x: int, y: int) -> None:
-        ctypes.windll.user32.SetCursorPos(int(x), int(y))
-        ctypes.windll.user32.mouse_event(MOUSEEVENTF_LEFTDOWN, 0, 0, 0, 0)
-        ctypes.windll.user32.mouse_event(MOUSEEVENTF_LEFTUP, 0, 0, 0, 0)
-
-
+from typing import List, Optional, Tuple
+
+from attack_plan import execute, load_plan
+from calibrate import use_calibrated_window
+from debug_writer import DebugWriter
+from deps import LazyModule, capabilities, tesseract
+from input_backend import get_injector
+from metrics import get_metrics
+from ocr import OcrCache, load_digit_recognizer, tesseract_number
+from screen import ChangeDetector, Probe, get_engine, to_pil_rgb
+from screen_index import Match, load_screen_index
+from screen_state import UNKNOWN, load_screen_classifier
+from watchers import Fired, first, run, screen_state, screen_stream
+
+# Optional dependencies, imported on first use (see deps.py). keyboard is the
+# quit-key listener; it is falsy without pynput or a display (e.g. headless runs)
+keyboard = LazyModule("pynput.keyboard")
+psutil = LazyModule("psutil")
 
 # Flag to control the monitoring loop
 running = True
 
+# Allowed per-channel colour difference for pixel checks; absorbs
+# compression/gamma drift such as (247, 13, 22) vs (247, 13, 23)
+COLOR_TOLERANCE = 3
+
+# Upper bounds (seconds) on the long waits so a missed colour never hangs the bot.
+# No known screen for SCREEN_TIMEOUT means a pop-up or menu is in the way, and
+# a click should move the game off its current screen within CHANGE_TIMEOUT
+SCREEN_TIMEOUT = 120
+SEARCH_TIMEOUT = 60
+BATTLE_TIMEOUT = 240
+CHANGE_TIMEOUT = 15
+
+# Native trophy digit templates, built with `python ocr.py build`; None falls back to tesseract
+DIGITS = load_digit_recognizer(os.path.join(os.path.dirname(os.path.abspath(__file__)), "trophy_digits.npz"))
+
+# OCR results keyed by the trophy box pixels; identical pixels are never re-read
+OCR_CACHE = OcrCache(maxsize=32)
+
+# OCR debug captures: "off", "failure" or "always"; written to debug_ocr/ off the main thread
+DEBUG_IMAGES = DebugWriter("debug_trophy_ocr_edrag", mode="failure")
+
+# Screens the loops branch on, told apart by their sentinel pixels and, once
+# screen_signatures.npz has been built with `python screen_state.py build`,
+# by whole-screen fingerprints as well
+SCREENS = load_screen_classifier(os.path.join(os.path.dirname(os.path.abspath(__file__)), "screen_signatures.npz"), {
+    "home": [Probe((77, 35), (33, 221, 255), tolerance=COLOR_TOLERANCE)],
+    "searching": [Probe((1, 1), (235, 240, 245), tolerance=COLOR_TOLERANCE)],
+    "battle": [Probe((90, 775), (247, 13, 22), tolerance=COLOR_TOLERANCE)],
+    "one_star": [Probe((90, 775), (247, 13, 22), tolerance=COLOR_TOLERANCE),
+                 Probe((1629, 809), (196, 200, 194), tolerance=COLOR_TOLERANCE)],
+    "results": [Probe((900, 955), (108, 187, 31), tolerance=COLOR_TOLERANCE)],
+})
+
+# The screens the main loop branches on. Any other screen the classifier knows
+# (attack_menu, army, ... once signatures are built) is waited out like an
+# unknown one and then backed out of
+LOOP_STATES = ("home", "searching", "battle", "one_star", "results")
+
+# Middle of the screen, watched for the search clouds clearing; a found base
+# changes it far more than drifting clouds do
+SEARCH_VIEW = ChangeDetector((480, 270, 960, 540), step=8, threshold=25.0)
+
+# Perceptual hashes of screens and pop-ups, built with `python screen_index.py build`;
+# names whatever is in the way when no known screen shows
+SCREEN_INDEX = load_screen_index(os.path.join(os.path.dirname(os.path.abspath(__file__)), "screen_index"))
+
+# Index labels of screens the loop does not branch on, and the box (x0, x1, y0, y1)
+# to click to move each one along; any other screen is backed out of with Escape
+RECOVERY_CLICKS = {
+    "attack_menu": (130, 500, 740, 860),
+    "army": (1525, 1850, 930, 980),
+    "surrender_confirm": (1020, 1320, 640, 740),
+}
+
+# Find the game window by its anchors (see calibrate.py) instead of assuming the
+# 1920x1080 layout at the top-left of the desktop; the fit is cached per window
+# geometry. WINDOW holds the calibrated window, here or under supervisor.py
+CALIBRATE = False
+WINDOW = None
+
+# Per-phase timing snapshot, e.g. "metrics.json" or "metrics.prom" (Prometheus
+# textfile), rewritten every minute; None leaves the timers switched off
+METRICS_FILE: Optional[str] = None
+METRICS = get_metrics()
+
+# Seed for the per-battle jitter/delay draws; set an int for reproducible runs
+PLAN_SEED: Optional[int] = None
+
 # Flag for if OCR failed on last, to allow if a certain number is bad
 last_ocr_failed = False  
 
@@ -64,59 +111,55 @@ def click_after_random_delay(x: int, y: int, lowtime: int = 1000, hightime: int
     """Wait 1000-2000 ms randomly, then left-click at screen coordinate (x, y)."""
     delay_ms = random.randint(lowtime, hightime)
     time.sleep(delay_ms / 1000.0)
-    if MouseController is not None and Button is not None:
-        mouse = MouseController()
-        mouse.position = (x, y)
-        mouse.click(Button.left, 1)
-    else:
-        # Fallback for Windows when pynput.mouse is unavailable
-        try:
-            _win_left_click(x, y)  # type: ignore[name-defined]
-        except Exception as e:
-            print(f"Mouse click failed: {e}")
+    click(x, y)
+
+
+def click(x: int, y: int) -> None:
+    """Left-click at screen coordinate (x, y) right away."""
+    get_injector().click(x, y)
+
+
+def click_burst(points: List[Tuple[int, int]], intervals: List[float]) -> None:
+    """Click points back to back with exact spacing, e.g. a spell stack."""
+    achieved = get_injector().burst(points, intervals)
+    logging.debug(f"Burst of {len(points)}: wanted {[round(i * 1000) for i in intervals]} ms, "
+                  f"got {[round(i * 1000, 1) for i in achieved]} ms")
 
 
 def _ocr_number_from_region(bbox: Tuple[int, int, int, int], required_digits: Optional[int] = None) -> Optional[int]:
-    """OCR a number from screen region with minimal preprocessing"""
+    """OCR a number from screen region, skipping the OCR if these exact pixels were read before"""
     left, top, right, bottom = bbox
     width, height = right - left, bottom - top
+
+    shot = get_engine().grab((left, top, width, height))
+    value = OCR_CACHE.lookup(shot, required_digits, lambda: _read_number(shot, required_digits))
+    logging.debug(f"OCR cache: {OCR_CACHE.stats()}")
+    # Saved on a background thread; only failures are kept by default
+    DEBUG_IMAGES.submit(shot, failed=value is None, tag=str(value))
+    return value
+
+
+def _read_number(shot: np.ndarray, required_digits: Optional[int] = None) -> Optional[int]:
+    """Native digit matcher first, then tesseract"""
+    # Fast path: template-match the fixed trophy font
+    if DIGITS is not None:
+        value = DIGITS.read(shot, required_digits)
+        if value is not None:
+            return value
     
-    with mss.mss() as sct:
-        shot = sct.grab({"left": left, "top": top, "width": width, "height": height})
-    
-    # Convert to PIL RGB
-    arr = np.asarray(shot)[:, :, :3][:, :, ::-1]
-    img = Image.fromarray(arr)
-    
-    # Minimal preprocessing - just upscale
-    img = img.resize((img.width * 4, img.height * 4), Image.LANCZOS)
-    
-    # Save debug image
-    img.save("debug_trophy_ocr_edrag.png")
-    print(f"Debug: Saved OCR region to debug_trophy_ocr_edrag.png")
-    
-    # Simple OCR configs to try
-    configs = [
-        "--oem 3 --psm 8 -c tessedit_char_whitelist=0123456789",
-        "--oem 3 --psm 7 -c tessedit_char_whitelist=0123456789", 
-        "--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789"
-    ]
-    
-    for config in configs:
-        try:
-            text = pytesseract.image_to_string(img, config=config).strip()
-            
-            # Extract number
-            match = re.search(r'\d+', text)
-            if match:
-                value = int(match.group())
-                digits = len(str(value))
-                
-                if required_digits is None or digits == required_digits:
-                    return value
-        except Exception as e:
-            print(f"OCR failed with config {config}: {e}")
-            continue
+    # Tesseract fallback, on hosts that have it
+    if tesseract() is not None:
+        from PIL import Image
+
+        # Convert to PIL RGB straight from the BGRA buffer
+        img = to_pil_rgb(shot)
+
+        # Minimal preprocessing - just upscale
+        img = img.resize((img.width * 4, img.height * 4), Image.LANCZOS)
+
+        value = tesseract_number(img, required_digits)
+        if value is not None:
+            return value
     
     print("All OCR attempts failed")
     return None
@@ -141,67 +184,64 @@ def trophies_above(target: int, required_digits: int = 4) -> bool:
     return value > int(target)
 
 
-def wait_until_pixel_not_color(expected_rgb: Tuple[int, int, int], point: Tuple[int, int]) -> bool:
-    """Wait until pixel (1,1) is no longer exactly expected_rgb.
-
-    Returns True when the pixel changes
-    """
-    poll_interval: float = 0.05
-
+def recover_to_home() -> None:
+    """Back out of an unrecognised screen; Escape closes menus and pop-ups in the game."""
+    if not keyboard:
+        return
     try:
-        with mss.mss() as sct:
-            while True:
-                if get_pixel_rgb(point) != expected_rgb:
-                    return True
-                time.sleep(poll_interval)
+        controller = keyboard.Controller()
+        controller.press(keyboard.Key.esc)
+        controller.release(keyboard.Key.esc)
     except Exception as e:
-        print(f"Pixel check failed: {e}")
-        return False
-    
-def wait_until_pixel_color(expected_rgb: Tuple[int, int, int], point: Tuple[int, int]) -> bool:
-    """Wait until pixel (1,1) is no longer exactly expected_rgb.
+        print(f"Could not send Escape: {e}")
 
-    Returns True when the pixel changes
-    """
-    poll_interval: float = 0.05
 
-    try:
-        with mss.mss() as sct:
-            while True:
-                if get_pixel_rgb(point) == expected_rgb:
-                    return True
-                time.sleep(poll_interval)
-    except Exception as e:
-        print(f"Pixel check failed: {e}")
-        return False
+def surrender() -> None:
+    """End a one-star battle: surrender, confirm, and wait for the prompt to go."""
+    click_after_random_delay(random.randint(60, 220), random.randint(780, 825))
+    click_after_random_delay(random.randint(1020, 1320), random.randint(640, 740), 50, 200)
+    changed = SCREENS.wait_state(exclude=("one_star",), timeout=CHANGE_TIMEOUT, max_interval=0.5)
+    METRICS.observe("wait", "surrender", changed.elapsed)
 
-def get_pixel_rgb(point: Tuple[int, int]) -> Tuple[int, int, int]:
-    try:
-        with mss.mss() as sct:
-            shot = sct.grab({"left": point[0], "top": point[1], "width": 1, "height": 1})
-            # mss returns BGRA
-            b, g, r, _ = np.array(shot)[0, 0]
-            return (int(r), int(g), int(b))
-    except Exception as e:
-        print(f"Pixel check failed: {e}")
-        return (0, 0, 0)
+
+async def battle_end() -> Fired:
+    """Watch for whichever ends the battle first: the one-star cue, the results screen,
+    any other known screen (results dismissed, a reconnect), or BATTLE_TIMEOUT.
+
+    Every watcher reads the same grab each tick, of only what SCREENS classifies on.
+    """
+    async with screen_stream(SCREENS) as stream:
+        return await first({
+            "one_star": screen_state(stream, SCREENS, ("one_star",)),
+            "results": screen_state(stream, SCREENS, ("results",)),
+            "left": screen_state(stream, SCREENS, exclude=("battle",)),
+        }, stream, timeout=BATTLE_TIMEOUT)
 
 
-def place_in_interval(point1: Tuple[int, int], point2: Tuple[int, int], number_of_units: int, lowtime: int = 200, hightime: int = 500) -> None:
-    xcoords = np.linspace(point1[0], point2[0], number_of_units)
-    ycoords = np.linspace(point1[1], point2[1], number_of_units)
-    for x, y in zip(xcoords, ycoords):
-        click_after_random_delay(int(x), int(y), lowtime, hightime)
+def back_out(blocker: Optional[Match]) -> None:
+    """Move off a screen the loop does not branch on: click it along if the
+    screen index named it in RECOVERY_CLICKS, otherwise recover_to_home()."""
+    box = RECOVERY_CLICKS.get(blocker.label) if blocker is not None else None
+    if box is None:
+        recover_to_home()
+        return
+    x0, x1, y0, y1 = box
+    click_after_random_delay(random.randint(x0, x1), random.randint(y0, y1))
 
 
 def main():
+    logging.info(f"Capabilities: {capabilities()}")
+
     # Increase the script's process priority to high
-    try:
-        p = psutil.Process(os.getpid())
-        p.nice(psutil.HIGH_PRIORITY_CLASS)
-    except (psutil.NoSuchProcess, psutil.AccessDenied) as e:
-        print(f"Could not set process priority: {e}")
-        logging.warning(f"Could not set process priority: {e}")
+    if psutil:
+        try:
+            p = psutil.Process(os.getpid())
+            p.nice(psutil.HIGH_PRIORITY_CLASS)
+        except (psutil.NoSuchProcess, psutil.AccessDenied, AttributeError) as e:
+            print(f"Could not set process priority: {e}")
+            logging.warning(f"Could not set process priority: {e}")
+    else:
+        print("psutil not installed; running at normal priority")
 
     # print("What trophies do you want to climb to?")
     # target_input = input()
@@ -226,83 +266,110 @@ def main():
     # click_after_random_delay(random.randint(1830, 1880), random.randint(80, 120))
 
     # Start a keyboard listener in a separate thread to listen for the quit command
-    listener = keyboard.Listener(on_press=on_press)
-    listener.start()
-    keyboard_controller = Controller()
+    listener = None
+    if keyboard:
+        listener = keyboard.Listener(on_press=on_press)
+        listener.start()
 
+    global WINDOW
+    if CALIBRATE and WINDOW is None:
+        WINDOW = use_calibrated_window()
+
+    # Create the mouse backend and its injection thread up front
+    injector = get_injector()
+    print(f"Mouse input via {injector.backend.name}")
+
+    # Compile the deployment once; a bad plan file fails here, before any clicks
+    rng = np.random.default_rng(PLAN_SEED)
+    plan = load_plan(os.path.join(os.path.dirname(os.path.abspath(__file__)), "plans", "valk.json"))
+
+    if METRICS_FILE:
+        METRICS.enable(METRICS_FILE)
+
+    # Branch on whichever screen is showing rather than assuming the next
+    # one, so slow loads are waited out and stray pop-ups are backed out of
+    deployed = False
     while running:
-        wait_until_pixel_color((33, 221, 255), (77, 35))
-        time.sleep(2)
-        # if (trophies_above(target)):
-        #     exit(0)
-        # Click attack
-        click_after_random_delay(random.randint(75, 175), random.randint(900, 1000), 100, 200)
-        # Click find match
-        click_after_random_delay(random.randint(130, 500), random.randint(740, 860), 500, 1000)
-        # Click attack on army screen
-        # wait_until_pixel_color((189, 235, 137), (1620, 950))
-        click_after_random_delay(random.randint(1525, 1850), random.randint(930, 980), 300, 600)
-        # Wait for base to be found
-        time.sleep(2)
-        wait_until_pixel_not_color((235, 240, 245), (1, 1))
-        wait_until_pixel_color((247, 13, 22), (90, 775))
-        # Select troop  
-        click_after_random_delay(random.randint(160, 260), random.randint(920, 1040))
-        # Place troop
-        place_in_interval((random.randint(210, 220), random.randint(510, 520)), (random.randint(880, 890), random.randint(30, 40)), 11, 50, 150)
-        place_in_interval((random.randint(1160, 1170), random.randint(30, 40)), (random.randint(1790, 1800), random.randint(510, 520)), 11, 50, 150)
-        place_in_interval((random.randint(1790, 1800), random.randint(520, 530)), (random.randint(1370, 1380), random.randint(850, 860)), 10, 50, 150)
-        place_in_interval((random.randint(670, 680), random.randint(850, 860)), (random.randint(210, 220), random.randint(520, 530)), 10, 50, 150)
-        # Siege Machine
-        click_after_random_delay(random.randint(320, 420), random.randint(920, 1040), 500, 1000)
-        click_after_random_delay(random.randint(1790, 1800), random.randint(510, 530), 300, 500)
-        # EQ spells for siege
-        click_after_random_delay(random.randint(1070, 1180), random.randint(920, 1040), 200, 300)
-        click_after_random_delay(random.randint(1380, 1400), random.randint(500, 520), 200, 300)
-        click_after_random_delay(random.randint(1380, 1400), random.randint(500, 520), 20, 50)
-        click_after_random_delay(random.randint(1380, 1400), random.randint(500, 520), 20, 50)
-        click_after_random_delay(random.randint(1380, 1400), random.randint(500, 520), 20, 50)
-        click_after_random_delay(random.randint(1380, 1400), random.randint(500, 520), 20, 50)
-        click_after_random_delay(random.randint(1380, 1400), random.randint(500, 520), 20, 50)
-        # EQ for heroes
-        click_after_random_delay(random.randint(1250, 1300), random.randint(550, 600), 200, 300)
-        click_after_random_delay(random.randint(1250, 1300), random.randint(550, 600), 20, 50)
-        click_after_random_delay(random.randint(1250, 1300), random.randint(550, 600), 20, 50)
-        click_after_random_delay(random.randint(1250, 1300), random.randint(550, 600), 20, 50)
-        click_after_random_delay(random.randint(1250, 1300), random.randint(550, 600), 20, 50)
-        click_after_random_delay(random.randint(1250, 1300), random.randint(550, 600), 20, 50)
-        # Place heroes
-        click_after_random_delay(random.randint(460, 560), random.randint(920, 1040), 300, 400)
-        click_after_random_delay(random.randint(1410, 1430), random.randint(800, 820), 300, 400)
-        click_after_random_delay(random.randint(620, 720), random.randint(920, 980), 300, 400)
-        click_after_random_delay(random.randint(1470, 1490), random.randint(755, 770), 300, 400)
-        click_after_random_delay(random.randint(760, 860), random.randint(920, 970), 300, 400)
-        click_after_random_delay(random.randint(1500, 1520), random.randint(730, 745), 300, 400)
-        click_after_random_delay(random.randint(910, 1020), random.randint(920, 1040), 300, 400)
-        click_after_random_delay(random.randint(1530, 1550), random.randint(707, 720), 300, 400)
-        # Activate abilities
-        click_after_random_delay(random.randint(460, 560), random.randint(920, 1040))
-        click_after_random_delay(random.randint(620, 720), random.randint(920, 1040), 100, 200)
-        click_after_random_delay(random.randint(910, 1020), random.randint(920, 1040), 100, 200)
-        click_after_random_delay(random.randint(760, 860), random.randint(920, 1040), 2000, 2100)
-        # End battle
-        while True:
-            if get_pixel_rgb((1629, 809)) == (196, 200, 194):
-                # 1 Star
-                click_after_random_delay(random.randint(60, 220), random.randint(780, 825))
-                click_after_random_delay(random.randint(1020, 1320), random.randint(640, 740), 50, 200)
-                break
-            if get_pixel_rgb((900, 955)) == (108, 187, 31):
-                # Battle ended
-                break
-            time.sleep(0.05)
-
-        # Return to base
-        click_after_random_delay(random.randint(840, 1080), random.randint(880, 960), 800, 950)
-
-
-
-    listener.join()
+        with METRICS.phase("detect"):
+            seen = SCREENS.wait_state(LOOP_STATES, timeout=SCREEN_TIMEOUT, max_interval=0.5)
+        METRICS.observe("wait", "screen", seen.elapsed)
+        if not seen.ok:
+            blocker = SCREEN_INDEX.identify() if SCREEN_INDEX is not None else None
+            if (blocker is None or blocker.label == UNKNOWN) and seen.value.state != UNKNOWN:
+                # The classifier named a screen the loop does not branch on
+                blocker = Match(seen.value.state, 0)
+            print(f"No known screen for {seen.elapsed:.0f}s"
+                  + (f" ({blocker.label}, {blocker.distance} bits)" if blocker else "") + ", backing out")
+            back_out(blocker)
+            if WINDOW is not None:
+                # A moved or resized window looks the same as an unknown screen
+                WINDOW.ensure()
+            continue
+        state = seen.value.state
+        logging.debug(f"Screen: {state} (distance {seen.value.distance:.1f})")
+
+        if state == "home":
+            deployed = False
+            # if (trophies_above(target)):
+            #     exit(0)
+            with METRICS.phase("matchmaking"):
+                # Click attack
+                click_after_random_delay(random.randint(75, 175), random.randint(900, 1000), 100, 200)
+                # Click find match
+                click_after_random_delay(random.randint(130, 500), random.randint(740, 860), 500, 1000)
+                # Click attack on army screen
+                # wait_until_pixel_color((189, 235, 137), (1620, 950))
+                click_after_random_delay(random.randint(1525, 1850), random.randint(930, 980), 300, 600)
+                changed = SCREENS.wait_state(exclude=("home",), timeout=CHANGE_TIMEOUT, max_interval=0.5)
+                METRICS.observe("wait", "leave_home", changed.elapsed)
+        elif state == "searching":
+            # A new battle is coming even if home was never seen (a reconnect)
+            deployed = False
+            # Wait for base to be found, then for the clouds to finish clearing
+            with METRICS.phase("matchmaking"):
+                found = SEARCH_VIEW.wait_changed(timeout=SEARCH_TIMEOUT, max_interval=0.25)
+                METRICS.observe("wait", "search_clouds", found.elapsed)
+                if found.ok:
+                    settled = SEARCH_VIEW.wait_stable(timeout=CHANGE_TIMEOUT, max_interval=0.1)
+                    METRICS.observe("wait", "search_settle", settled.elapsed)
+        elif state in ("battle", "one_star") and not deployed:
+            # Deploy: troops, heroes, spells and abilities from the attack plan.
+            # The one-star cue can show before anything is placed; deploy anyway
+            # rather than turn a search into a lost battle
+            with METRICS.phase("deployment"):
+                deploy = execute(plan.realise(rng), click, burst=click_burst)
+            deployed = True
+            logging.debug(f"Deploy lateness: {deploy.summary()}")
+        elif state == "battle":
+            # End battle: the one-star cue, the results screen or any other known screen
+            with METRICS.phase("battle"):
+                fired = run(battle_end())
+            METRICS.observe("wait", "battle_end", fired.elapsed)
+            logging.debug(f"Battle end after {fired.elapsed:.1f}s: {fired.name}")
+            if fired.name == "timeout":
+                print(f"Timed out after {fired.elapsed:.0f}s waiting for the battle to end")
+            elif fired.name == "one_star":
+                # Surrender straight away rather than after another detect
+                with METRICS.phase("return"):
+                    surrender()
+        elif state == "one_star" and deployed:
+            with METRICS.phase("return"):
+                surrender()
+        elif state == "results":
+            # Return to base
+            with METRICS.phase("return"):
+                click_after_random_delay(random.randint(840, 1080), random.randint(880, 960), 800, 950)
+                changed = SCREENS.wait_state(exclude=("results",), timeout=CHANGE_TIMEOUT, max_interval=0.5)
+                METRICS.observe("wait", "leave_results", changed.elapsed)
+            METRICS.cycle_done()
+            logging.debug(f"Click latency: {injector.stats()}")
+
+
+    DEBUG_IMAGES.flush()
+    if METRICS_FILE:
+        METRICS.write()
+    if listener is not None:
+        listener.join()
 
 
 
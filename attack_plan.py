@@ -0,0 +1,259 @@
+"""Declarative attack plans.
+
+A plan is a JSON file of phases, each a list of steps:
+
+    {"click": [[x0, x1], [y0, y1]], "delay": [lo_ms, hi_ms]}
+        One click somewhere in the box after a random delay. A coordinate
+        may also be a plain int.
+    {"click": ..., "repeat": 6, "repeat_delay": [20, 50]}
+        The same click six times; clicks after the first use repeat_delay.
+    {"click": ..., "repeat": 6, "repeat_delay": [20, 50], "burst": true}
+        As above, but the repeats are handed to the injector as one burst
+        with exact spacing instead of sleep-then-click each.
+    {"line": {"from": P, "to": P, "count": 11}, "delay": [200, 500]}
+        count clicks evenly spaced from one point to another, like
+        place_in_interval. Each end point is drawn once per battle.
+
+Any point may instead be an object keyed by variant name, e.g.
+{"right_top": [1100, 20], "left_top": [220, 480]}. One of the plan's
+"variants" is picked per battle. "shared_offset": [lo, hi] draws one
+offset per battle that is added to both coordinates of every step
+marked "shift": true. Steps without "delay" use "default_delay". Unknown
+phase or step keys are rejected, so a misspelt option cannot be ignored.
+
+load_plan() validates the file and compiles every variant into a flat
+list of Actions once at startup, packed into NumPy arrays. realise()
+draws every jitter and delay for a whole battle in one batch from a
+numpy Generator (seed it for reproducible runs) and execute() then only
+waits for each step's deadline and clicks.
+"""
+import json
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from scheduler import DeadlineScheduler
+
+# (x_lo, x_hi, y_lo, y_hi), inclusive
+Box = Tuple[int, int, int, int]
+
+DEFAULT_DELAY = (1000, 2000)
+
+# Keys a plan's phases and steps may use; anything else is a typo
+PHASE_KEYS = {"name", "steps"}
+STEP_KEYS = {"click", "line", "delay", "repeat", "repeat_delay", "burst", "shift"}
+
+
+class Action(NamedTuple):
+    """One compiled click: position is slot a + t * (slot b - slot a).
+
+    burst marks a click sent in a burst with the click before it.
+    """
+    phase: str
+    a: int
+    b: int
+    t: float
+    delay: Tuple[int, int]
+    shift: bool
+    burst: bool = False
+
+
+class Step(NamedTuple):
+    """One realised click: wait delay seconds, then click (x, y)."""
+    phase: str
+    delay: float
+    x: int
+    y: int
+    burst: bool = False
+
+
+class Timeline(NamedTuple):
+    """A variant's flat action list and the same data packed into arrays.
+
+    slots holds the random boxes actions draw from, one row per box as
+    (x_lo, x_hi, y_lo, y_hi). The remaining arrays have one entry per
+    action, in order.
+    """
+    actions: List[Action]
+    slots: np.ndarray
+    a: np.ndarray
+    b: np.ndarray
+    t: np.ndarray
+    delay: np.ndarray
+    shift: np.ndarray
+    burst: np.ndarray
+
+    @classmethod
+    def pack(cls, slots: List[Box], actions: List[Action]) -> "Timeline":
+        return cls(
+            actions,
+            np.array(slots, dtype=np.int64).reshape(-1, 4),
+            np.array([x.a for x in actions], dtype=np.intp),
+            np.array([x.b for x in actions], dtype=np.intp),
+            np.array([x.t for x in actions], dtype=np.float64),
+            np.array([x.delay for x in actions], dtype=np.int64).reshape(-1, 2),
+            np.array([x.shift for x in actions], dtype=bool),
+            np.array([x.burst for x in actions], dtype=bool),
+        )
+
+
+def _range(value, where: str) -> Tuple[int, int]:
+    if isinstance(value, bool):
+        raise ValueError(f"{where}: expected int or [lo, hi], got {value!r}")
+    if isinstance(value, int):
+        return (value, value)
+    if (isinstance(value, list) and len(value) == 2 and all(isinstance(v, int) and not isinstance(v, bool) for v in value)
+            and value[0] <= value[1]):
+        return (value[0], value[1])
+    raise ValueError(f"{where}: expected int or [lo, hi] with lo <= hi, got {value!r}")
+
+
+def _box(point, where: str) -> Box:
+    if not (isinstance(point, list) and len(point) == 2):
+        raise ValueError(f"{where}: expected a point [x, y], got {point!r}")
+    x_lo, x_hi = _range(point[0], f"{where} x")
+    y_lo, y_hi = _range(point[1], f"{where} y")
+    return (x_lo, x_hi, y_lo, y_hi)
+
+
+class AttackPlan:
+    """A validated plan compiled into one flat Timeline per variant."""
+
+    def __init__(self, spec: dict, source: str = "<plan>") -> None:
+        if not isinstance(spec, dict):
+            raise ValueError(f"{source}: plan must be a JSON object")
+        self.name = spec.get("name", source)
+        self.variants: List[str] = spec.get("variants") or ["default"]
+        if not all(isinstance(v, str) for v in self.variants) or len(set(self.variants)) != len(self.variants):
+            raise ValueError(f"{source}: variants must be unique names")
+        self.shared_offset = _range(spec["shared_offset"], f"{source} shared_offset") if "shared_offset" in spec else (0, 0)
+        self.default_delay = _range(spec.get("default_delay", list(DEFAULT_DELAY)), f"{source} default_delay")
+        phases = spec.get("phases")
+        if not isinstance(phases, list) or not phases:
+            raise ValueError(f"{source}: plan needs a non-empty 'phases' list")
+        for i, phase in enumerate(phases):
+            if not isinstance(phase, dict):
+                raise ValueError(f"{source} phase {i}: phase must be an object")
+            unknown = set(phase) - PHASE_KEYS
+            if unknown:
+                raise ValueError(f"{source} phase {i}: unknown key(s) {', '.join(sorted(unknown))}")
+        self.phases = [p.get("name", f"phase{i}") for i, p in enumerate(phases)]
+        self.timelines: Dict[str, Timeline] = {
+            variant: self._compile(phases, variant, source) for variant in self.variants
+        }
+
+    def _point(self, point, variant: str, where: str) -> Box:
+        if isinstance(point, dict):
+            missing = [v for v in self.variants if v not in point]
+            if missing:
+                raise ValueError(f"{where}: no point for variant(s) {', '.join(missing)}")
+            point = point[variant]
+        return _box(point, where)
+
+    def _compile(self, phases: list, variant: str, source: str) -> Timeline:
+        slots: List[Box] = []
+        actions: List[Action] = []
+
+        def slot(point, where: str) -> int:
+            slots.append(self._point(point, variant, where))
+            return len(slots) - 1
+
+        for phase in phases:
+            name = phase.get("name", "?")
+            steps = phase.get("steps")
+            if not isinstance(steps, list):
+                raise ValueError(f"{source} phase {name!r}: 'steps' must be a list")
+            for i, step in enumerate(steps):
+                where = f"{source} phase {name!r} step {i}"
+                if not isinstance(step, dict):
+                    raise ValueError(f"{where}: step must be an object")
+                unknown = set(step) - STEP_KEYS
+                if unknown:
+                    raise ValueError(f"{where}: unknown key(s) {', '.join(sorted(unknown))}")
+                delay = _range(step["delay"], f"{where} delay") if "delay" in step else self.default_delay
+                shift = bool(step.get("shift", False))
+                if "click" in step:
+                    repeat = step.get("repeat", 1)
+                    if not isinstance(repeat, int) or repeat < 1:
+                        raise ValueError(f"{where}: repeat must be a positive int")
+                    repeat_delay = _range(step["repeat_delay"], f"{where} repeat_delay") if "repeat_delay" in step else delay
+                    burst = bool(step.get("burst", False))
+                    for n in range(repeat):
+                        s = slot(step["click"], f"{where} click")
+                        actions.append(Action(name, s, s, 0.0, delay if n == 0 else repeat_delay, shift, burst and n > 0))
+                elif "line" in step:
+                    line = step["line"]
+                    if not isinstance(line, dict) or not {"from", "to", "count"} <= set(line):
+                        raise ValueError(f"{where}: line needs 'from', 'to' and 'count'")
+                    count = line["count"]
+                    if not isinstance(count, int) or count < 1:
+                        raise ValueError(f"{where}: line count must be a positive int")
+                    a = slot(line["from"], f"{where} line from")
+                    b = slot(line["to"], f"{where} line to")
+                    for n in range(count):
+                        actions.append(Action(name, a, b, n / (count - 1) if count > 1 else 0.0, delay, shift))
+                else:
+                    raise ValueError(f"{where}: step needs 'click' or 'line'")
+        return Timeline.pack(slots, actions)
+
+    def realise(self, rng: Optional[np.random.Generator] = None, variant: Optional[str] = None) -> List[Step]:
+        """Concrete steps for one battle, with every random value drawn in one batch."""
+        rng = rng if rng is not None else np.random.default_rng()
+        if variant is None:
+            variant = self.variants[int(rng.integers(len(self.variants)))]
+        tl = self.timelines[variant]
+        offset = rng.integers(self.shared_offset[0], self.shared_offset[1] + 1)
+        # One draw per slot, shared by every action (e.g. a whole line) using it
+        px = rng.integers(tl.slots[:, 0], tl.slots[:, 1] + 1)
+        py = rng.integers(tl.slots[:, 2], tl.slots[:, 3] + 1)
+        delays = rng.integers(tl.delay[:, 0], tl.delay[:, 1] + 1) / 1000.0
+        shift = np.where(tl.shift, offset, 0)
+        xs = (px[tl.a] + tl.t * (px[tl.b] - px[tl.a])).astype(np.int64) + shift
+        ys = (py[tl.a] + tl.t * (py[tl.b] - py[tl.a])).astype(np.int64) + shift
+        return [Step(action.phase, d, x, y, action.burst)
+                for action, d, x, y in zip(tl.actions, delays.tolist(), xs.tolist(), ys.tolist())]
+
+
+def load_plan(path: str) -> AttackPlan:
+    """Read and compile a plan file, raising ValueError if it is malformed."""
+    with open(path) as f:
+        try:
+            spec = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"{path}: invalid JSON: {e}") from e
+    return AttackPlan(spec, path)
+
+
+def execute(steps: List[Step], click: Callable[[int, int], None],
+            sleep: Optional[Callable[[float], None]] = None,
+            burst: Optional[Callable[[List[Tuple[int, int]], List[float]], object]] = None,
+            scheduler: Optional[DeadlineScheduler] = None) -> DeadlineScheduler:
+    """Run realised steps on absolute deadlines: wait out the rest of each delay, click.
+
+    Step delays are laid end to end from the moment execution starts, so
+    time spent clicking does not push later steps back. With a burst
+    callable, a click followed by burst-flagged steps is sent as one
+    burst(points, intervals) call; without one, burst steps run like any
+    other. Returns the scheduler, whose summary() reports lateness per
+    phase.
+    """
+    scheduler = scheduler or DeadlineScheduler(sleep=sleep)
+    scheduler.start()
+    i = 0
+    while i < len(steps):
+        step = steps[i]
+        j = i + 1
+        if burst is not None:
+            while j < len(steps) and steps[j].burst:
+                j += 1
+        scheduler.wait(step.delay, step.phase)
+        if j - i > 1:
+            group = steps[i:j]
+            intervals = [s.delay for s in group[1:]]
+            burst([(s.x, s.y) for s in group], intervals)
+            scheduler.advance(sum(intervals))
+        else:
+            click(step.x, step.y)
+        i = j
+    return scheduler
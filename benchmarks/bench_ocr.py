@@ -0,0 +1,89 @@
+"""Trophy OCR: native digit matcher vs the tesseract path, latency and accuracy.
+
+    python benchmarks/bench_ocr.py [labelled_folder]
+
+Labelled crops are named after the number they show ("4312_a.png"). Half
+are used to build templates and the other half are scored. Without a
+folder, synthetic trophy-style crops are rendered with Pillow. The
+tesseract rows are skipped when pytesseract or the binary is missing.
+"""
+import os
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from ocr import DigitRecognizer, load_labelled_samples, tesseract_number  # noqa: E402
+
+
+def synthetic_samples(count: int = 200, seed: int = 0):
+    """Trophy-box-sized crops: white outlined digits on a noisy dark background."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    rng = random.Random(seed)
+    try:
+        font = ImageFont.load_default(size=30)
+    except TypeError:
+        font = ImageFont.load_default()
+    samples = []
+    for _ in range(count):
+        label = str(rng.randint(1000, 9999))
+        img = Image.new("RGB", (110, 55), (40 + rng.randint(0, 20), 60, 110))
+        draw = ImageDraw.Draw(img)
+        draw.text((6 + rng.randint(0, 6), 8 + rng.randint(0, 4)), label, fill=(255, 255, 255),
+                  font=font, stroke_width=2, stroke_fill=(20, 20, 20))
+        arr = np.asarray(img).astype(np.int16)
+        arr += np.random.default_rng(rng.randint(0, 1 << 30)).integers(-6, 7, arr.shape, dtype=np.int16)
+        samples.append((np.clip(arr, 0, 255).astype(np.uint8), label))
+    return samples
+
+
+def tesseract_available() -> bool:
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def run(name, fn, samples):
+    times, correct = [], 0
+    for frame, label in samples:
+        start = time.perf_counter()
+        value = fn(frame, len(label))
+        times.append((time.perf_counter() - start) * 1000)
+        correct += value is not None and str(value) == label
+    times.sort()
+    p95 = times[int(len(times) * 0.95) - 1]
+    print(f"{name:<10}{statistics.median(times):>10.3f}{p95:>10.3f}{correct / len(samples):>10.1%}")
+
+
+def main() -> None:
+    samples = load_labelled_samples(sys.argv[1]) if len(sys.argv) > 1 else synthetic_samples()
+    train, test = samples[::2], samples[1::2]
+    recognizer = DigitRecognizer.from_samples(train)
+
+    def native(frame, digits):
+        return recognizer.read(frame, digits)
+
+    def tesseract(frame, digits):
+        from PIL import Image
+        img = Image.fromarray(frame)
+        img = img.resize((img.width * 4, img.height * 4), Image.LANCZOS)
+        return tesseract_number(img, digits)
+
+    print(f"{len(test)} test crops")
+    print(f"{'path':<10}{'p50 ms':>10}{'p95 ms':>10}{'accuracy':>10}")
+    run("native", native, test)
+    if tesseract_available():
+        run("tesseract", tesseract, test)
+    else:
+        print("tesseract not available, skipping")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Allocations per poll: old copy-based pixel helpers vs zero-copy views.
+
+Run from the repo root:  python benchmarks/bench_pixel_access.py
+
+For a 1x1 grab the copy is four bytes and the two paths are a wash; the
+saving grows with the region size (probe bounding boxes, OCR crops).
+Needs numpy; the OCR conversion rows also need Pillow. No screen or mss
+install is required, a stand-in for mss.ScreenShot is used.
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from screen import frame_from_raw, to_pil_rgb  # noqa: E402
+
+
+class FakeShot:
+    """Just enough of mss.ScreenShot: a BGRA bytearray plus the array interface."""
+
+    def __init__(self, width: int, height: int) -> None:
+        self.width = width
+        self.height = height
+        self.raw = bytearray(os.urandom(width * height * 4))
+
+    @property
+    def __array_interface__(self):
+        return {"version": 3, "shape": (self.height, self.width, 4), "typestr": "|u1", "data": self.raw}
+
+
+def old_pixel(shot):
+    b, g, r, _ = np.array(shot)[0, 0]
+    return (int(r), int(g), int(b))
+
+
+def new_pixel(shot):
+    b, g, r = frame_from_raw(shot.raw, shot.width, shot.height)[0, 0, :3]
+    return (int(r), int(g), int(b))
+
+
+def old_region_probe(shot):
+    b, g, r, _ = np.array(shot)[-1, -1]
+    return (int(r), int(g), int(b))
+
+
+def new_region_probe(shot):
+    b, g, r = frame_from_raw(shot.raw, shot.width, shot.height)[-1, -1, :3]
+    return (int(r), int(g), int(b))
+
+
+def old_ocr_image(shot):
+    from PIL import Image
+    arr = np.asarray(shot)[:, :, :3][:, :, ::-1]
+    return Image.fromarray(arr)
+
+
+def new_ocr_image(shot):
+    return to_pil_rgb(frame_from_raw(shot.raw, shot.width, shot.height))
+
+
+def measure(fn, shot, rounds: int = 2000):
+    """(peak bytes allocated per call, microseconds per call)."""
+    fn(shot)  # warm caches and imports
+    tracemalloc.start()
+    total = 0
+    for _ in range(rounds):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        fn(shot)
+        total += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(shot)
+    elapsed = time.perf_counter() - start
+    return total / rounds, elapsed / rounds * 1e6
+
+
+def main() -> None:
+    rows = [
+        ("pixel 1x1", old_pixel, new_pixel, FakeShot(1, 1)),
+        # Bounding box of ValkSpammer's battle-end probes
+        ("probe region 730x147", old_region_probe, new_region_probe, FakeShot(730, 147)),
+    ]
+    try:
+        import PIL  # noqa: F401
+        rows.append(("ocr region 110x55", old_ocr_image, new_ocr_image, FakeShot(110, 55)))
+    except ImportError:
+        print("Pillow not installed, skipping OCR conversion rows")
+
+    print(f"{'case':<22}{'path':<6}{'peak bytes/call':>16}{'us/call':>10}")
+    for name, old, new, shot in rows:
+        for label, fn in (("old", old), ("new", new)):
+            peak, us = measure(fn, shot)
+            print(f"{name:<22}{label:<6}{peak:>16.0f}{us:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Benchmark suite: capture, probes, OCR and full simulated attack cycles.
+
+    python benchmarks/run_benchmarks.py [-o bench_results.json] [--baseline old.json]
+
+Everything runs against synthetic frames (screen.SyntheticBackend and the
+headless simulator), so it needs no display; startup rows time a fresh
+interpreter importing each bot. --real-screen adds rows for
+mss grabs of the actual desktop. Results are written as JSON; with
+--baseline, any case whose p50 got slower by more than --tolerance is
+reported and the exit code is 1.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import simulator  # noqa: E402
+from ocr import tesseract_number  # noqa: E402
+from screen import CaptureEngine, MssBackend, Probe, ProbeSet, SyntheticBackend, to_pil_rgb  # noqa: E402
+
+TROPHY_REGION = (140, 165, 100, 35)
+
+
+def distribution(samples_s: List[float]) -> Dict[str, float]:
+    """Latency summary in microseconds."""
+    us = np.sort(np.asarray(samples_s) * 1e6)
+    return {
+        "n": int(len(us)),
+        "mean_us": float(us.mean()),
+        "min_us": float(us[0]),
+        "p50_us": float(np.percentile(us, 50)),
+        "p90_us": float(np.percentile(us, 90)),
+        "p99_us": float(np.percentile(us, 99)),
+        "max_us": float(us[-1]),
+    }
+
+
+def time_calls(fn: Callable[[], object], rounds: int, warmup: int = 20) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return distribution(samples)
+
+
+def home_frame() -> np.ndarray:
+    sim = simulator.GameSimulator()
+    return sim.frame()
+
+
+def capture_cases(rounds: int, real_screen: bool) -> Dict[str, Dict[str, float]]:
+    frame = home_frame()
+    backends = {"synthetic": SyntheticBackend(frame)}
+    if real_screen:
+        backends["mss"] = MssBackend()
+    results = {}
+    for label, backend in backends.items():
+        # ttl=0: every call reaches the backend, as a poll after a sleep would
+        engine = CaptureEngine(backend, ttl=0)
+        single = ProbeSet({"home": Probe((77, 35), (33, 221, 255), tolerance=3)}, engine)
+        battle_end = ProbeSet({
+            "one_star": Probe((1629, 809), (196, 200, 194), tolerance=3),
+            "battle_ended": Probe((900, 955), (108, 187, 31), tolerance=3),
+        }, engine)
+        results[f"pixel_rgb.{label}"] = time_calls(lambda: engine.pixel_rgb((77, 35)), rounds)
+        results[f"probe_single.{label}"] = time_calls(single.evaluate, rounds)
+        results[f"probe_battle_end.{label}"] = time_calls(battle_end.fired, rounds)
+        results[f"grab_trophy_box.{label}"] = time_calls(lambda: engine.grab(TROPHY_REGION), rounds)
+        results[f"grab_full_screen.{label}"] = time_calls(lambda: engine.grab((0, 0, 1920, 1080)), max(rounds // 10, 10))
+    cached = CaptureEngine(backends["synthetic"])
+    results["pixel_rgb.cached"] = time_calls(lambda: cached.pixel_rgb((77, 35)), rounds)
+    return results
+
+
+def ocr_cases(rounds: int) -> Dict[str, Dict[str, float]]:
+    frame = home_frame()
+    x, y, w, h = TROPHY_REGION
+    crop = np.ascontiguousarray(frame[y:y + h, x:x + w])
+    recognizer = simulator.digit_recognizer()
+    results = {"ocr_native": time_calls(lambda: recognizer.read(crop, 4), rounds)}
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+    except Exception:
+        return results
+
+    def tesseract():
+        img = to_pil_rgb(crop)
+        img = img.resize((img.width * 4, img.height * 4))
+        return tesseract_number(img, 4)
+
+    results["ocr_tesseract"] = time_calls(tesseract, max(rounds // 100, 5), warmup=1)
+    return results
+
+
+def cycle_cases(cycles: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for script in ("EDragSpammer", "ValkSpammer", "TrophyDropper"):
+        # Keep the bots' prints out of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            run = simulator.run_script(script, cycles=cycles, seed=0)
+        results[f"cycle.{script}"] = {
+            "cycles": run.cycles,
+            "wall_per_cycle_ms": run.wall_seconds / max(run.cycles, 1) * 1000,
+            "sim_seconds_per_cycle": run.sim_seconds / max(run.cycles, 1),
+            "battles_per_hour": run.battles_per_hour,
+            "clicks_per_cycle": run.clicks / max(run.cycles, 1),
+        }
+    return results
+
+
+def startup_cases(rounds: int = 7) -> Dict[str, Dict[str, float]]:
+    """Fresh-interpreter import time of each bot, the cost paid before its first click."""
+    results = {}
+    for script in ("EDragSpammer", "ValkSpammer", "TrophyDropper"):
+        samples = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", f"import {script}"], cwd=ROOT, check=True,
+                           stdout=subprocess.DEVNULL)
+            samples.append(time.perf_counter() - start)
+        results[f"startup.{script}"] = distribution(samples)
+    return results
+
+
+def metadata() -> Dict[str, str]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip()
+    except Exception:
+        commit = ""
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+    }
+
+
+def regressions(current: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Cases whose p50 (or wall time per cycle) got slower than baseline by more than tolerance."""
+    found = []
+    for name, stats in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        key = "p50_us" if "p50_us" in stats else "wall_per_cycle_ms"
+        if key in old and old[key] > 0 and stats[key] > old[key] * (1 + tolerance):
+            found.append(f"{name}: {key} {old[key]:.1f} -> {stats[key]:.1f}")
+    return found
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", default="bench_results.json")
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--real-screen", action="store_true", help="also time mss grabs of the real desktop")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = {}
+    results.update(capture_cases(args.rounds, args.real_screen))
+    results.update(ocr_cases(args.rounds))
+    results.update(cycle_cases(args.cycles))
+    results.update(startup_cases())
+    report = {"meta": metadata(), "results": results}
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    for name, stats in results.items():
+        if "p50_us" in stats:
+            print(f"{name:<32} p50 {stats['p50_us']:>10.1f} us   p99 {stats['p99_us']:>10.1f} us")
+        else:
+            print(f"{name:<32} {stats['wall_per_cycle_ms']:>8.1f} ms/cycle wall, "
+                  f"{stats['battles_per_hour']:.1f} battles/h simulated")
+    print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = regressions(report, json.load(f), args.tolerance)
+        for line in slower:
+            print(f"REGRESSION {line}")
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,443 @@
+"""Find the game window by its UI anchors and map the 1920x1080 layout onto it.
+
+Anchors are small crops of a reference screenshot taken in the standard
+layout (the button or icon and where its top-left sits), kept in
+anchors/anchors.json next to their PNGs. Calibration looks for each one
+in the window's area by normalised cross-correlation, computed with FFTs
+and integral images over a coarse copy first and refined at full
+resolution, at every window size from MIN_WINDOW_WIDTH up to the whole
+area, and fits a layout -> screen transform to the hits: affine
+with three or more anchors, scale plus offset with fewer.
+
+Results are cached in calibration_cache.json keyed by the window's
+geometry, so later runs start instantly. CalibratedWindow.verify()
+re-checks the anchors where the cached transform puts them; only when
+that fails is the search run again.
+
+    python calibrate.py cut <reference screenshot> <name> <left> <top> <width> <height>
+    python calibrate.py run [left top width height]
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from screen import CaptureBackend, MssBackend, Region, SyntheticBackend
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ANCHOR_DIR = os.path.join(HERE, "anchors")
+CACHE_PATH = os.path.join(HERE, "calibration_cache.json")
+
+LAYOUT_SIZE = (1920, 1080)
+
+# The window can sit anywhere in the searched region at any size from
+# MIN_WINDOW_WIDTH up to the region itself: anchors are first tried at
+# scales SCALE_RATIO apart over that range, then at REFINE_STEPS around
+# the best of them
+MIN_WINDOW_WIDTH = 640
+SCALE_RATIO = 1.08
+REFINE_STEPS = (0.96, 0.98, 1.02, 1.04)
+
+
+def grey(frame: np.ndarray) -> np.ndarray:
+    """float32 luma of a BGRA frame."""
+    f = frame[:, :, :3].astype(np.float32)
+    return f[:, :, 2] * 0.299 + f[:, :, 1] * 0.587 + f[:, :, 0] * 0.114
+
+
+def _shrink(image: np.ndarray, factor: int) -> np.ndarray:
+    if factor == 1:
+        return image
+    h, w = (image.shape[0] // factor) * factor, (image.shape[1] // factor) * factor
+    return image[:h, :w].reshape(h // factor, factor, w // factor, factor).mean(axis=(1, 3))
+
+
+def _resize(image: np.ndarray, scale: float) -> np.ndarray:
+    """Nearest-pixel resize, enough for matching flat UI art."""
+    h = max(int(round(image.shape[0] * scale)), 1)
+    w = max(int(round(image.shape[1] * scale)), 1)
+    ys = np.minimum((np.arange(h) / scale).astype(np.intp), image.shape[0] - 1)
+    xs = np.minimum((np.arange(w) / scale).astype(np.intp), image.shape[1] - 1)
+    return image[ys[:, None], xs[None, :]]
+
+
+def match_template(image: np.ndarray, template: np.ndarray) -> np.ndarray:
+    """Normalised cross-correlation of template at every valid offset in image.
+
+    Returns an (H - h + 1, W - w + 1) map in [-1, 1]. The correlation is
+    one FFT product; window means and variances come from integral
+    images, so the cost does not depend on the template size.
+    """
+    ih, iw = image.shape
+    th, tw = template.shape
+    if th > ih or tw > iw:
+        return np.full((1, 1), -1.0, dtype=np.float32)
+    t = template - template.mean()
+    t_norm = np.sqrt((t * t).sum())
+    spectrum = np.fft.rfft2(image) * np.conj(np.fft.rfft2(t, s=image.shape))
+    corr = np.fft.irfft2(spectrum, s=image.shape)[:ih - th + 1, :iw - tw + 1]
+    padded = np.pad(image.astype(np.float64), ((1, 0), (1, 0)))
+    s1 = padded.cumsum(0).cumsum(1)
+    s2 = (padded * padded).cumsum(0).cumsum(1)
+
+    def window_sum(s):
+        return s[th:, tw:] - s[:-th, tw:] - s[th:, :-tw] + s[:-th, :-tw]
+
+    n = th * tw
+    var = window_sum(s2) - window_sum(s1) ** 2 / n
+    denom = np.sqrt(np.maximum(var, 1e-6)) * max(t_norm, 1e-6)
+    return (corr / denom).astype(np.float32)
+
+
+class Hit(NamedTuple):
+    x: int
+    y: int
+    scale: float
+    score: float
+
+
+def find_template(image: np.ndarray, template: np.ndarray, scales: Sequence[float] = (1.0,),
+                  coarse_width: int = 480) -> Hit:
+    """Best match of template in image over scales: top-left, scale and NCC score.
+
+    Each scale is searched on copies shrunk so the image is about
+    coarse_width wide, then refined at full resolution around the best
+    coarse hit.
+    """
+    best = Hit(0, 0, 1.0, -1.0)
+    for scale in scales:
+        tpl = _resize(template, scale) if scale != 1.0 else template
+        factor = max(1, min(image.shape[1] // coarse_width, min(tpl.shape) // 4))
+        scores = match_template(_shrink(image, factor), _shrink(tpl, factor))
+        cy, cx = np.unravel_index(int(np.argmax(scores)), scores.shape)
+        # Refine inside the coarse cell plus a margin
+        margin = 2 * factor
+        x0, y0 = max(cx * factor - margin, 0), max(cy * factor - margin, 0)
+        x1 = min(cx * factor + margin + tpl.shape[1], image.shape[1])
+        y1 = min(cy * factor + margin + tpl.shape[0], image.shape[0])
+        fine = match_template(image[y0:y1, x0:x1], tpl)
+        fy, fx = np.unravel_index(int(np.argmax(fine)), fine.shape)
+        if fine[fy, fx] > best.score:
+            best = Hit(int(x0 + fx), int(y0 + fy), float(scale), float(fine[fy, fx]))
+    return best
+
+
+class Anchor(NamedTuple):
+    """A template and the layout position of its top-left corner."""
+    name: str
+    template: np.ndarray
+    layout: Tuple[int, int]
+
+    @property
+    def centre(self) -> Tuple[float, float]:
+        return self.layout[0] + self.template.shape[1] / 2, self.layout[1] + self.template.shape[0] / 2
+
+
+def load_anchors(folder: str = ANCHOR_DIR) -> List[Anchor]:
+    """Anchors listed in folder/anchors.json, templates as greyscale arrays."""
+    from PIL import Image
+
+    path = os.path.join(folder, "anchors.json")
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        spec = json.load(f)
+    anchors = []
+    for name, entry in spec.items():
+        with Image.open(os.path.join(folder, entry["file"])) as img:
+            frame = SyntheticBackend(np.asarray(img.convert("RGB"))).screen()
+        anchors.append(Anchor(name, grey(frame), tuple(entry["layout"])))
+    return anchors
+
+
+def fit_transform(layout: np.ndarray, found: np.ndarray, scales: Sequence[float]) -> np.ndarray:
+    """(3, 2) matrix M with [x, y, 1] @ M mapping layout points to screen points.
+
+    Three or more points get a least-squares affine fit; with fewer the
+    anchors' own matched scale is used with the mean offset.
+    """
+    if len(layout) >= 3:
+        design = np.hstack([layout, np.ones((len(layout), 1))])
+        matrix, *_ = np.linalg.lstsq(design, found, rcond=None)
+        return matrix
+    scale = float(np.mean(scales))
+    offset = (found - scale * layout).mean(axis=0)
+    return np.array([[scale, 0.0], [0.0, scale], offset])
+
+
+class Calibration(NamedTuple):
+    matrix: np.ndarray
+    scores: Dict[str, float]
+
+    @property
+    def left(self) -> int:
+        return int(round(self.matrix[2, 0]))
+
+    @property
+    def top(self) -> int:
+        return int(round(self.matrix[2, 1]))
+
+    @property
+    def scale(self) -> float:
+        return float((self.matrix[0, 0] + self.matrix[1, 1]) / 2)
+
+    def to_screen(self, x: float, y: float) -> Tuple[int, int]:
+        sx, sy = np.array([x, y, 1.0]) @ self.matrix
+        return int(round(sx)), int(round(sy))
+
+    def screen_region(self, region: Region) -> Region:
+        left, top, width, height = region
+        x0, y0 = self.to_screen(left, top)
+        x1, y1 = self.to_screen(left + width, top + height)
+        return x0, y0, max(x1 - x0, 1), max(y1 - y0, 1)
+
+
+def sweep_scales(region: Region, min_width: int = MIN_WINDOW_WIDTH) -> List[float]:
+    """Coarse template scales for a window between min_width wide and as large as region."""
+    top = min(region[2] / LAYOUT_SIZE[0], region[3] / LAYOUT_SIZE[1])
+    scale = min(min_width / LAYOUT_SIZE[0], top)
+    scales = []
+    while scale < top:
+        scales.append(scale)
+        scale *= SCALE_RATIO
+    scales.append(top)
+    return scales
+
+
+def calibrate(capture: CaptureBackend, region: Region, anchors: Sequence[Anchor], min_score: float = 0.8) -> Calibration:
+    """Search region for every anchor and fit the layout -> screen transform."""
+    if not anchors:
+        raise RuntimeError(f"No anchors to calibrate with; cut some into {ANCHOR_DIR} with `python calibrate.py cut`")
+    image = grey(capture.grab(region))
+    sweep = sweep_scales(region)
+    layout, found, scales, scores = [], [], [], {}
+    for anchor in anchors:
+        hit = find_template(image, anchor.template, sweep)
+        refined = find_template(image, anchor.template, [hit.scale * s for s in REFINE_STEPS])
+        if refined.score > hit.score:
+            hit = refined
+        scores[anchor.name] = round(hit.score, 3)
+        if hit.score < min_score:
+            continue
+        h, w = anchor.template.shape
+        layout.append(anchor.centre)
+        found.append((region[0] + hit.x + w * hit.scale / 2, region[1] + hit.y + h * hit.scale / 2))
+        scales.append(hit.scale)
+    if not found:
+        raise RuntimeError(f"No anchor found in {region}: {scores}")
+    matrix = fit_transform(np.array(layout, dtype=np.float64), np.array(found, dtype=np.float64), scales)
+    return Calibration(matrix, scores)
+
+
+@contextlib.contextmanager
+def _file_lock(path: str, timeout: float = 10.0):
+    """Hold path + ".lock" across processes; a lock file older than timeout is taken as stale."""
+    lock = path + ".lock"
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock) > timeout:
+                    os.remove(lock)
+                    continue
+            except OSError:
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Could not lock {path}")
+            time.sleep(0.01)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(lock)
+
+
+class CalibratedWindow:
+    """Layout -> screen mapping for one window, cached on disk and re-checked on demand.
+
+    Usable wherever a supervisor.Window is: to_screen, screen_region,
+    left, top and scale all follow the current calibration.
+    """
+
+    def __init__(self, region: Region, capture: Optional[CaptureBackend] = None,
+                 anchors: Optional[Sequence[Anchor]] = None, cache_path: str = CACHE_PATH,
+                 min_score: float = 0.8) -> None:
+        self.region = tuple(region)
+        self.capture = capture if capture is not None else MssBackend()
+        self.anchors = list(anchors) if anchors is not None else load_anchors()
+        self.cache_path = cache_path
+        self.min_score = min_score
+        self._lock = threading.Lock()
+        self.calibration = self._cached()
+        if self.calibration is None:
+            self.recalibrate()
+        elif not self.verify():
+            # The window moved inside the same region since the fit was cached
+            print(f"Cached calibration for window {self.key} no longer matches, recalibrating")
+            self.recalibrate()
+
+    @property
+    def key(self) -> str:
+        return ",".join(str(v) for v in self.region)
+
+    def _cached(self) -> Optional[Calibration]:
+        try:
+            with open(self.cache_path) as f:
+                entry = json.load(f).get(self.key)
+        except (OSError, ValueError):
+            return None
+        if entry is None:
+            return None
+        return Calibration(np.array(entry["matrix"]), entry["scores"])
+
+    def _store(self, calibration: Calibration) -> None:
+        # Supervisor workers share one cache file: the read-modify-write is
+        # serialised, and each writer stages into its own temporary file
+        with _file_lock(self.cache_path):
+            try:
+                with open(self.cache_path) as f:
+                    cache = json.load(f)
+            except (OSError, ValueError):
+                cache = {}
+            cache[self.key] = {"matrix": calibration.matrix.tolist(), "scores": calibration.scores,
+                               "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.cache_path)),
+                                       prefix=os.path.basename(self.cache_path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(cache, f, indent=1)
+                os.replace(tmp, self.cache_path)
+            except BaseException:
+                os.remove(tmp)
+                raise
+
+    def recalibrate(self) -> Calibration:
+        calibration = calibrate(self.capture, self.region, self.anchors, self.min_score)
+        with self._lock:
+            self.calibration = calibration
+        self._store(calibration)
+        print(f"Calibrated window {self.key}: origin ({calibration.left}, {calibration.top}), "
+              f"scale {calibration.scale:.3f}")
+        return calibration
+
+    def verify(self, margin: int = 4) -> bool:
+        """True if every anchor still sits where the calibration puts it."""
+        cal = self.calibration
+        rl, rt, rw, rh = self.region
+        for anchor in self.anchors:
+            h, w = anchor.template.shape
+            x, y, sw, sh = cal.screen_region((anchor.layout[0], anchor.layout[1], w, h))
+            # The margin is kept inside the calibrated area, which a window at
+            # the desktop edge would otherwise overhang
+            left, top = max(x - margin, rl), max(y - margin, rt)
+            right, bottom = min(x + sw + margin, rl + rw), min(y + sh + margin, rt + rh)
+            if right - left < sw or bottom - top < sh:
+                return False
+            crop = grey(self.capture.grab((left, top, right - left, bottom - top)))
+            scale = sw / w
+            tpl = _resize(anchor.template, scale) if abs(scale - 1.0) > 1e-3 else anchor.template
+            if match_template(crop, tpl).max() < self.min_score:
+                return False
+        return True
+
+    def ensure(self) -> bool:
+        """Re-run calibration if verify() fails; returns whether it was needed."""
+        if self.verify():
+            return False
+        print(f"Anchors moved in window {self.key}, recalibrating")
+        self.recalibrate()
+        return True
+
+    @property
+    def left(self) -> int:
+        return self.calibration.left
+
+    @property
+    def top(self) -> int:
+        return self.calibration.top
+
+    @property
+    def scale(self) -> float:
+        return self.calibration.scale
+
+    def to_screen(self, x: float, y: float) -> Tuple[int, int]:
+        return self.calibration.to_screen(x, y)
+
+    def screen_region(self, region: Region) -> Region:
+        return self.calibration.screen_region(region)
+
+
+def use_calibrated_window(region: Optional[Region] = None) -> CalibratedWindow:
+    """Calibrate (or reuse the cached fit for) the window in region and route
+    this process's capture and clicks through it."""
+    import input_backend
+    import screen
+    from supervisor import WindowCapture, WindowInput, desktop_region
+
+    capture = MssBackend()
+    window = CalibratedWindow(region if region is not None else desktop_region(), capture)
+    screen.set_backend(WindowCapture(capture, window))
+    input_backend.set_backend(WindowInput(input_backend.default_backend(), window))
+    return window
+
+
+def cut_anchor(screenshot: str, name: str, box: Region, folder: str = ANCHOR_DIR) -> str:
+    """Save box of a 1920x1080 reference screenshot as anchor name."""
+    from PIL import Image
+
+    os.makedirs(folder, exist_ok=True)
+    left, top, width, height = box
+    file = f"{name}.png"
+    with Image.open(screenshot) as img:
+        img.crop((left, top, left + width, top + height)).save(os.path.join(folder, file))
+    path = os.path.join(folder, "anchors.json")
+    spec = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            spec = json.load(f)
+    spec[name] = {"file": file, "layout": [left, top]}
+    with open(path, "w") as f:
+        json.dump(spec, f, indent=1)
+    return os.path.join(folder, file)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Cut UI anchors or calibrate a game window.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    cut = sub.add_parser("cut")
+    cut.add_argument("screenshot")
+    cut.add_argument("name")
+    cut.add_argument("box", type=int, nargs=4, metavar="N", help="left top width height")
+    run = sub.add_parser("run")
+    run.add_argument("region", type=int, nargs="*", help="window area: left top width height (default: whole desktop)")
+    run.add_argument("--force", action="store_true", help="ignore the cache")
+    args = parser.parse_args()
+
+    if args.command == "cut":
+        print(f"Saved {cut_anchor(args.screenshot, args.name, tuple(args.box))}")
+        return 0
+    if args.region and len(args.region) != 4:
+        parser.error("region is left top width height")
+    from supervisor import desktop_region
+
+    region = tuple(args.region) if args.region else desktop_region()
+    window = CalibratedWindow(region)
+    if args.force or not window.verify():
+        window.recalibrate()
+    cal = window.calibration
+    print(f"origin ({cal.left}, {cal.top}), scale {cal.scale:.3f}, anchor scores {cal.scores}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
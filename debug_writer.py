@@ -0,0 +1,107 @@
+"""Background writer for debug captures.
+
+Saving PNGs on the bot thread adds disk latency to every cycle, so images
+are queued to a daemon thread instead. Only the most recent ring_size
+files are kept per writer, which leaves a short history of failed reads
+to look at without filling the disk.
+"""
+import itertools
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+import numpy as np
+
+MODES = ("off", "failure", "always")
+
+# Shared by every writer in the process; with the PID in the name, no two
+# files ever get the same name
+_sequence = itertools.count()
+
+
+class DebugWriter:
+    """Queue images to disk on a background thread, keeping a bounded ring.
+
+    mode "off" drops everything, "failure" keeps only submissions marked
+    failed, "always" keeps all of them. submit() never blocks: if the
+    writer falls behind, new images are dropped and counted.
+    """
+
+    def __init__(self, prefix: str, folder: str = "debug_ocr", mode: str = "failure",
+                 ring_size: int = 50, queue_size: int = 16) -> None:
+        if mode not in MODES:
+            raise ValueError(f"Debug mode must be one of {MODES}, got {mode!r}")
+        self.prefix = prefix
+        self.folder = folder
+        self.mode = mode
+        self.ring_size = ring_size
+        self.dropped = 0
+        self.written = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._files: deque = deque()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def wants(self, failed: bool) -> bool:
+        return self.mode == "always" or (self.mode == "failure" and failed)
+
+    def submit(self, image, failed: bool = False, tag: str = "") -> bool:
+        """Queue a BGRA frame or PIL image for saving. Returns False if skipped."""
+        if not self.wants(failed):
+            return False
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait((image, failed, tag, time.time()))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self) -> None:
+        """Block until everything queued so far is on disk."""
+        if self._thread is not None:
+            self._queue.join()
+
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                os.makedirs(self.folder, exist_ok=True)
+                # Earlier runs' files count towards the ring too
+                self._files.extend(sorted(
+                    os.path.join(self.folder, f) for f in os.listdir(self.folder)
+                    if f.startswith(self.prefix + "_") and f.endswith(".png")))
+                self._thread = threading.Thread(target=self._run, name=f"debug-writer-{self.prefix}", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            image, failed, tag, stamp = self._queue.get()
+            try:
+                self._write(image, failed, tag, stamp)
+            except Exception as e:
+                print(f"Debug image write failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, image, failed: bool, tag: str, stamp: float) -> None:
+        if isinstance(image, np.ndarray):
+            from screen import to_pil_rgb
+            image = to_pil_rgb(image)
+        status = "fail" if failed else "ok"
+        name = (f"{self.prefix}_{time.strftime('%Y%m%d-%H%M%S', time.localtime(stamp))}_{os.getpid()}"
+                f"_{next(_sequence):05d}_{status}")
+        if tag:
+            name += f"_{tag}"
+        path = os.path.join(self.folder, name + ".png")
+        image.save(path)
+        self.written += 1
+        self._files.append(path)
+        while len(self._files) > self.ring_size:
+            old = self._files.popleft()
+            try:
+                os.remove(old)
+            except OSError:
+                pass
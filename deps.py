@@ -0,0 +1,106 @@
+"""Optional dependencies, imported the first time they are used.
+
+pytesseract, PIL, psutil and pynput add tens of milliseconds to startup
+and are missing or unusable on some hosts (no tesseract install, no
+display). None of them is needed to start a bot, so they are held in a
+LazyModule until then: attribute access imports the module, and truth
+testing tells whether it could be imported.
+
+    python deps.py      # report what this host can do
+"""
+import importlib
+import importlib.util
+import os
+import shutil
+import threading
+from types import ModuleType
+from typing import Dict, Optional
+
+# Where the Windows installer puts tesseract; used only if it exists there
+TESSERACT_CMD = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access.
+
+    bool(lazy) imports it and is False if that failed, so
+    `if keyboard:` replaces the old try/except-import-then-None dance.
+    """
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._module: Optional[ModuleType] = None
+        self._error: Optional[Exception] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> Optional[ModuleType]:
+        """The module, importing it on the first call; None if it cannot be imported."""
+        if self._module is None and self._error is None:
+            with self._lock:
+                if self._module is None and self._error is None:
+                    try:
+                        self._module = importlib.import_module(self._name)
+                    except Exception as e:
+                        self._error = e
+        return self._module
+
+    def __bool__(self) -> bool:
+        return self.load() is not None
+
+    def __getattr__(self, attr: str):
+        module = self.load()
+        if module is None:
+            raise ImportError(f"{self._name} is not available: {self._error}")
+        return getattr(module, attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "failed" if self._error is not None else "not loaded"
+        return f"<LazyModule {self._name} ({state})>"
+
+
+def available(name: str) -> bool:
+    """Whether module name is installed, without importing it."""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def tesseract_binary() -> Optional[str]:
+    if os.path.exists(TESSERACT_CMD):
+        return TESSERACT_CMD
+    return shutil.which("tesseract")
+
+
+_pytesseract = LazyModule("pytesseract")
+_tesseract_configured = False
+
+
+def tesseract() -> Optional[ModuleType]:
+    """pytesseract pointed at the tesseract binary, or None if either is not installed."""
+    global _tesseract_configured
+    binary = tesseract_binary()
+    if binary is None:
+        return None
+    module = _pytesseract.load()
+    if module is not None and not _tesseract_configured:
+        module.pytesseract.tesseract_cmd = binary
+        _tesseract_configured = True
+    return module
+
+
+def capabilities() -> Dict[str, bool]:
+    """What this host can do, judged without importing anything heavy."""
+    return {
+        "capture": available("mss"),
+        "imaging": available("PIL"),
+        "tesseract": available("pytesseract") and tesseract_binary() is not None,
+        "priority": available("psutil"),
+        "quit_key": available("pynput"),
+        "mouse": available("pynput") or os.name == "nt" or available("evdev"),
+    }
+
+
+if __name__ == "__main__":
+    for name, ok in capabilities().items():
+        print(f"{name:<10} {'yes' if ok else 'no'}")
@@ -0,0 +1,267 @@
+"""Mouse input for the bot scripts.
+
+One backend object is created per process and driven from a dedicated
+injection thread (ClickInjector). Clicks are queued with the monotonic
+time they are due; the thread sleeps until then, injects, and records how
+late each click landed so latency and jitter can be reported.
+
+Backends: pynput, the Win32 API via ctypes, Linux uinput via python-evdev,
+and RecordingBackend for tests and simulations.
+"""
+import queue
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+
+class InputBackend:
+    """Something that can move the pointer and left-click. Created once."""
+
+    name = "base"
+
+    def click(self, x: int, y: int) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class PynputBackend(InputBackend):
+    name = "pynput"
+
+    def __init__(self) -> None:
+        from pynput.mouse import Button, Controller
+        self._button = Button.left
+        self._mouse = Controller()
+
+    def click(self, x: int, y: int) -> None:
+        self._mouse.position = (x, y)
+        self._mouse.click(self._button, 1)
+
+
+class WinApiBackend(InputBackend):
+    name = "winapi"
+
+    MOUSEEVENTF_LEFTDOWN = 0x0002
+    MOUSEEVENTF_LEFTUP = 0x0004
+
+    def __init__(self) -> None:
+        import ctypes
+        user32 = ctypes.windll.user32  # type: ignore[attr-defined]
+        self._set_cursor_pos = user32.SetCursorPos
+        self._mouse_event = user32.mouse_event
+
+    def click(self, x: int, y: int) -> None:
+        self._set_cursor_pos(int(x), int(y))
+        self._mouse_event(self.MOUSEEVENTF_LEFTDOWN, 0, 0, 0, 0)
+        self._mouse_event(self.MOUSEEVENTF_LEFTUP, 0, 0, 0, 0)
+
+
+class UinputBackend(InputBackend):
+    """Virtual absolute pointer via /dev/uinput (needs python-evdev and write access).
+
+    The device copies the capabilities of a VM "USB tablet": absolute X/Y,
+    three mouse buttons and a wheel, no BTN_TOUCH or BTN_TOOL_* and no
+    INPUT_PROP_DIRECT. udev therefore tags it ID_INPUT_MOUSE rather than a
+    tablet or touchscreen, and libinput (X11 and Wayland compositors alike)
+    drives the cursor with it. Its range covers the whole screen_size
+    desktop; compositors that do not use libinput may ignore it.
+    """
+
+    name = "uinput"
+
+    def __init__(self, screen_size: Tuple[int, int] = (1920, 1080)) -> None:
+        from evdev import AbsInfo, UInput, ecodes as e
+        self._e = e
+        width, height = screen_size
+        caps = {
+            e.EV_KEY: [e.BTN_LEFT, e.BTN_RIGHT, e.BTN_MIDDLE],
+            e.EV_REL: [e.REL_WHEEL],
+            e.EV_ABS: [
+                (e.ABS_X, AbsInfo(0, 0, width - 1, 0, 0, 0)),
+                (e.ABS_Y, AbsInfo(0, 0, height - 1, 0, 0, 0)),
+            ],
+        }
+        self._device = UInput(caps, name="coc-scripts-pointer", bustype=e.BUS_USB)
+
+    def click(self, x: int, y: int) -> None:
+        e, dev = self._e, self._device
+        dev.write(e.EV_ABS, e.ABS_X, int(x))
+        dev.write(e.EV_ABS, e.ABS_Y, int(y))
+        dev.syn()
+        dev.write(e.EV_KEY, e.BTN_LEFT, 1)
+        dev.syn()
+        dev.write(e.EV_KEY, e.BTN_LEFT, 0)
+        dev.syn()
+
+    def close(self) -> None:
+        self._device.close()
+
+
+class RecordingBackend(InputBackend):
+    """Records clicks instead of sending them; on_click lets a simulator react."""
+
+    name = "recording"
+
+    def __init__(self, on_click: Optional[Callable[[int, int], None]] = None,
+                 clock: Optional[Callable[[], float]] = None) -> None:
+        self.clicks: List[Tuple[float, int, int]] = []
+        self.on_click = on_click
+        self.clock = clock
+
+    def click(self, x: int, y: int) -> None:
+        self.clicks.append((self.clock() if self.clock is not None else time.monotonic(), x, y))
+        if self.on_click is not None:
+            self.on_click(x, y)
+
+
+def default_backend() -> InputBackend:
+    """First backend that can be created here: pynput, then Win32, then uinput."""
+    errors = []
+    for cls in (PynputBackend, WinApiBackend, UinputBackend):
+        try:
+            return cls()
+        except Exception as e:
+            errors.append(f"{cls.name}: {e}")
+    raise RuntimeError("No mouse input backend available (" + "; ".join(errors) + ")")
+
+
+class ClickTicket:
+    """Handle for a queued click; wait() blocks until it has been injected."""
+
+    def __init__(self, x: int, y: int, due: float) -> None:
+        self.x = x
+        self.y = y
+        self.due = due
+        self.done_at: Optional[float] = None
+        self.error: Optional[Exception] = None
+        self._event = threading.Event()
+
+    @property
+    def latency(self) -> Optional[float]:
+        """Seconds between when the click was due and when it finished."""
+        return None if self.done_at is None else self.done_at - self.due
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._event.wait(timeout)
+
+
+class ClickInjector:
+    """Dedicated thread that injects queued clicks at their due time.
+
+    Clicks run in submission order. The thread sleeps until spin seconds
+    before a click is due and busy-waits the rest, which keeps scheduling
+    jitter well under a millisecond on most systems.
+    """
+
+    def __init__(self, backend: Optional[InputBackend] = None, clock: Optional[Callable[[], float]] = None,
+                 spin: float = 0.002, history: int = 1000) -> None:
+        self.backend = backend if backend is not None else default_backend()
+        # None means time.monotonic, resolved on each call
+        self._clock = clock
+        self.spin = spin
+        self._queue: "queue.Queue[Optional[ClickTicket]]" = queue.Queue()
+        self._latencies: deque = deque(maxlen=history)
+        self._thread = threading.Thread(target=self._run, name="click-injector", daemon=True)
+        self._thread.start()
+
+    def submit(self, x: int, y: int, at: Optional[float] = None) -> ClickTicket:
+        """Queue a click for monotonic time at (now if None); returns at once."""
+        ticket = ClickTicket(int(x), int(y), self.clock() if at is None else at)
+        self._queue.put(ticket)
+        return ticket
+
+    def click(self, x: int, y: int, at: Optional[float] = None) -> ClickTicket:
+        """Queue a click and wait until it has been injected."""
+        ticket = self.submit(x, y, at)
+        ticket.wait()
+        return ticket
+
+    def burst(self, points: Sequence[Tuple[int, int]], intervals: Union[float, Sequence[float]]) -> List[float]:
+        """Send clicks at points spaced by intervals seconds on the monotonic clock.
+
+        The first click is due now and every later one at a fixed offset
+        from it, so spacing does not accumulate per-click overhead. A
+        single float spaces all clicks evenly; otherwise intervals[i] is
+        the gap before points[i + 1]. Returns the gaps actually achieved.
+        """
+        if isinstance(intervals, (int, float)):
+            intervals = [float(intervals)] * (len(points) - 1)
+        if len(intervals) != len(points) - 1:
+            raise ValueError(f"burst of {len(points)} clicks needs {len(points) - 1} intervals, got {len(intervals)}")
+        due = self.clock()
+        tickets = []
+        for i, (x, y) in enumerate(points):
+            if i:
+                due += intervals[i - 1]
+            tickets.append(self.submit(x, y, at=due))
+        tickets[-1].wait()
+        done = [t.done_at for t in tickets]
+        return [b - a for a, b in zip(done, done[1:])]
+
+    def clock(self) -> float:
+        return self._clock() if self._clock is not None else time.monotonic()
+
+    def _run(self) -> None:
+        while True:
+            ticket = self._queue.get()
+            if ticket is None:
+                return
+            remaining = ticket.due - self.clock()
+            if remaining > self.spin:
+                time.sleep(remaining - self.spin)
+            while self.clock() < ticket.due:
+                pass
+            try:
+                self.backend.click(ticket.x, ticket.y)
+            except Exception as e:
+                ticket.error = e
+                print(f"Mouse click failed: {e}")
+            ticket.done_at = self.clock()
+            self._latencies.append(ticket.done_at - ticket.due)
+            ticket._event.set()
+
+    def stats(self) -> Dict[str, float]:
+        """Latency from due time to click done, in milliseconds."""
+        lat = sorted(self._latencies)
+        if not lat:
+            return {"count": 0}
+        return {
+            "count": len(lat),
+            "mean_ms": statistics.fmean(lat) * 1000,
+            "p50_ms": lat[len(lat) // 2] * 1000,
+            "p95_ms": lat[min(len(lat) - 1, int(len(lat) * 0.95))] * 1000,
+            "max_ms": lat[-1] * 1000,
+            "jitter_ms": (statistics.pstdev(lat) if len(lat) > 1 else 0.0) * 1000,
+        }
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=1)
+        self.backend.close()
+
+
+_injector: Optional[ClickInjector] = None
+_injector_lock = threading.Lock()
+
+
+def get_injector() -> ClickInjector:
+    """The process-wide ClickInjector, created with default_backend() on first use."""
+    global _injector
+    if _injector is None:
+        with _injector_lock:
+            if _injector is None:
+                _injector = ClickInjector()
+    return _injector
+
+
+def set_backend(backend: InputBackend, **kwargs) -> ClickInjector:
+    """Replace the shared injector with one driving backend (e.g. RecordingBackend)."""
+    global _injector
+    with _injector_lock:
+        if _injector is not None:
+            _injector.close()
+        _injector = ClickInjector(backend, **kwargs)
+    return _injector
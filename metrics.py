@@ -0,0 +1,159 @@
+"""Per-phase timing metrics for the bot loops.
+
+Off by default: until enable() is called, phase() hands back a shared
+no-op context manager and observe() returns straight away, so the
+instrumentation left in the loops costs a function call.
+
+When enabled, every observation goes into a rolling window per (kind,
+name), e.g. ("phase", "deployment") or ("wait", "search_clouds"), plus cumulative
+Prometheus-style histogram buckets. A snapshot is written every
+`interval` seconds, as JSON or as a Prometheus textfile (".prom").
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+import numpy as np
+
+# Histogram bucket upper bounds, seconds
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, float("inf"))
+
+_NULL = contextlib.nullcontext()
+
+
+class _Series:
+    __slots__ = ("window", "buckets", "count", "total")
+
+    def __init__(self, window: int) -> None:
+        self.window: Deque[float] = deque(maxlen=window)
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.window.append(seconds)
+        self.count += 1
+        self.total += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+
+class Metrics:
+    """Rolling histograms of phase and wait durations with periodic export."""
+
+    def __init__(self, window: int = 200) -> None:
+        self.window = window
+        self.enabled = False
+        self.path: Optional[str] = None
+        self.interval = 60.0
+        self.cycles = 0
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._lock = threading.Lock()
+        self._last_write = 0.0
+
+    def enable(self, path: str, interval: float = 60.0) -> None:
+        """Start recording and write a snapshot to path every interval seconds."""
+        self.path = path
+        self.interval = interval
+        self.enabled = True
+        self._last_write = time.monotonic()
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def phase(self, name: str):
+        """Context manager timing one named phase of a cycle."""
+        if not self.enabled:
+            return _NULL
+        return self._timed("phase", name)
+
+    @contextlib.contextmanager
+    def _timed(self, kind: str, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(kind, name, time.perf_counter() - start)
+
+    def observe(self, kind: str, name: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            series = self._series.get((kind, name))
+            if series is None:
+                series = self._series[(kind, name)] = _Series(self.window)
+            series.add(seconds)
+        self._maybe_write()
+
+    def cycle_done(self) -> None:
+        if not self.enabled:
+            return
+        self.cycles += 1
+        self._maybe_write()
+
+    def snapshot(self) -> dict:
+        """Current rolling percentiles and cumulative totals per series."""
+        out: Dict[str, Dict[str, dict]] = {}
+        with self._lock:
+            for (kind, name), s in self._series.items():
+                recent = np.fromiter(s.window, dtype=np.float64)
+                p50, p90, p99 = np.percentile(recent, [50, 90, 99]) if len(recent) else (0.0, 0.0, 0.0)
+                out.setdefault(kind, {})[name] = {
+                    "count": s.count, "sum_s": s.total,
+                    "recent_p50_s": float(p50), "recent_p90_s": float(p90), "recent_p99_s": float(p99),
+                    "recent_max_s": float(recent.max()) if len(recent) else 0.0,
+                }
+        return {"timestamp": time.time(), "cycles": self.cycles, **out}
+
+    def prometheus(self) -> str:
+        """Snapshot in the Prometheus text exposition format."""
+        lines = ["# TYPE coc_cycles_total counter", f"coc_cycles_total {self.cycles}"]
+        with self._lock:
+            kinds = sorted({kind for kind, _ in self._series})
+            for kind in kinds:
+                metric = f"coc_{kind}_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                for (k, name), s in sorted(self._series.items()):
+                    if k != kind:
+                        continue
+                    running = 0
+                    for bound, n in zip(BUCKETS, s.buckets):
+                        running += n
+                        le = "+Inf" if bound == float("inf") else repr(float(bound))
+                        lines.append(f'{metric}_bucket{{{kind}="{name}",le="{le}"}} {running}')
+                    lines.append(f'{metric}_sum{{{kind}="{name}"}} {s.total}')
+                    lines.append(f'{metric}_count{{{kind}="{name}"}} {s.count}')
+        return "\n".join(lines) + "\n"
+
+    def write(self) -> None:
+        """Write a snapshot now, atomically replacing the previous file."""
+        if not self.path:
+            return
+        text = self.prometheus() if self.path.endswith(".prom") else json.dumps(self.snapshot(), indent=2)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, self.path)
+
+    def _maybe_write(self) -> None:
+        now = time.monotonic()
+        if now - self._last_write >= self.interval:
+            self._last_write = now
+            try:
+                self.write()
+            except OSError as e:
+                print(f"Metrics write failed: {e}")
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """The process-wide Metrics instance (disabled until enable() is called)."""
+    return _metrics
@@ -0,0 +1,239 @@
+"""Number reading for the trophy counter.
+
+DigitRecognizer is a small NumPy template matcher for the game's fixed
+font: threshold the crop, split glyphs on empty columns, resize each glyph
+to a fixed grid and pick the best-correlated digit template. It runs in
+well under a millisecond, so tesseract is only needed as a fallback.
+
+Templates are learned from labelled crops (file name starts with the
+number, e.g. "4312_home.png"):
+
+    python ocr.py build samples/ trophy_digits.npz
+"""
+import hashlib
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from deps import tesseract
+
+# Glyph grid every digit is resampled to before matching
+GLYPH_SHAPE = (16, 12)
+
+TESSERACT_CONFIGS = [
+    "--oem 3 --psm 8 -c tessedit_char_whitelist=0123456789",
+    "--oem 3 --psm 7 -c tessedit_char_whitelist=0123456789",
+    "--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789",
+]
+
+
+def ink_mask(frame: np.ndarray, threshold: int = 200) -> np.ndarray:
+    """Boolean mask of bright (text) pixels in a BGRA or RGB frame."""
+    return frame[:, :, :3].min(axis=2) >= threshold
+
+
+def segment_glyphs(mask: np.ndarray, min_width: int = 2, min_height: int = 4) -> List[np.ndarray]:
+    """Split a text mask into per-glyph masks on empty columns, left to right."""
+    cols = mask.any(axis=0)
+    # Run boundaries of inked columns
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], cols.view(np.int8), [0]))))
+    glyphs = []
+    for start, stop in zip(edges[::2], edges[1::2]):
+        if stop - start < min_width:
+            continue
+        glyph = mask[:, start:stop]
+        rows = np.flatnonzero(glyph.any(axis=1))
+        if len(rows) < min_height:
+            continue
+        glyphs.append(glyph[rows[0]:rows[-1] + 1])
+    return glyphs
+
+
+def normalise_glyph(glyph: np.ndarray) -> np.ndarray:
+    """Nearest-neighbour resample to GLYPH_SHAPE, flattened, zero-mean, unit-norm."""
+    h, w = glyph.shape
+    ys = (np.arange(GLYPH_SHAPE[0]) * h // GLYPH_SHAPE[0])
+    xs = (np.arange(GLYPH_SHAPE[1]) * w // GLYPH_SHAPE[1])
+    vec = glyph[ys[:, None], xs].astype(np.float32).ravel()
+    vec -= vec.mean()
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class DigitRecognizer:
+    """Template matcher for a single fixed digit font."""
+
+    def __init__(self, templates: np.ndarray, threshold: int = 200, min_score: float = 0.6) -> None:
+        # templates: (10, prod(GLYPH_SHAPE)), row d is digit d
+        self.templates = np.asarray(templates, dtype=np.float32)
+        self.threshold = threshold
+        self.min_score = min_score
+
+    def read_digits(self, frame: np.ndarray) -> Tuple[str, float]:
+        """Recognised digit string and the weakest glyph's match score."""
+        glyphs = segment_glyphs(ink_mask(frame, self.threshold))
+        if not glyphs:
+            return "", 0.0
+        vecs = np.stack([normalise_glyph(g) for g in glyphs])
+        scores = vecs @ self.templates.T
+        best = scores.argmax(axis=1)
+        confidence = float(scores[np.arange(len(best)), best].min())
+        return "".join(str(d) for d in best), confidence
+
+    def read(self, frame: np.ndarray, required_digits: Optional[int] = None) -> Optional[int]:
+        """The number in frame, or None if unsure or the digit count is wrong."""
+        text, confidence = self.read_digits(frame)
+        if not text or confidence < self.min_score:
+            return None
+        if required_digits is not None and len(text) != required_digits:
+            return None
+        return int(text)
+
+    @classmethod
+    def from_samples(cls, samples: Iterable[Tuple[np.ndarray, str]], threshold: int = 200,
+                     min_score: float = 0.6) -> "DigitRecognizer":
+        """Average the glyphs of labelled crops into one template per digit."""
+        sums = np.zeros((10, GLYPH_SHAPE[0] * GLYPH_SHAPE[1]), dtype=np.float32)
+        counts = np.zeros(10)
+        for frame, label in samples:
+            glyphs = segment_glyphs(ink_mask(frame, threshold))
+            if len(glyphs) != len(label):
+                # Touching or broken glyphs; skip rather than mislabel
+                continue
+            for glyph, char in zip(glyphs, label):
+                sums[int(char)] += normalise_glyph(glyph)
+                counts[int(char)] += 1
+        missing = [str(d) for d in range(10) if not counts[d]]
+        if missing:
+            raise ValueError(f"No usable samples for digits: {', '.join(missing)}")
+        templates = sums / counts[:, None]
+        templates -= templates.mean(axis=1, keepdims=True)
+        templates /= np.linalg.norm(templates, axis=1, keepdims=True)
+        return cls(templates, threshold, min_score)
+
+    def save(self, path: str) -> None:
+        np.savez(path, templates=self.templates, threshold=self.threshold, min_score=self.min_score)
+
+    @classmethod
+    def load(cls, path: str) -> "DigitRecognizer":
+        data = np.load(path)
+        return cls(data["templates"], int(data["threshold"]), float(data["min_score"]))
+
+
+def load_digit_recognizer(path: str) -> Optional[DigitRecognizer]:
+    """DigitRecognizer from path, or None if no templates have been built yet."""
+    if not os.path.exists(path):
+        return None
+    try:
+        return DigitRecognizer.load(path)
+    except Exception as e:
+        print(f"Could not load digit templates from {path}: {e}")
+        return None
+
+
+def tesseract_number(img, required_digits: Optional[int] = None) -> Optional[int]:
+    """Run tesseract over a PIL image with a few page modes; first valid number wins.
+
+    Returns None straight away on hosts without pytesseract.
+    """
+    pytesseract = tesseract()
+    if pytesseract is None:
+        return None
+
+    for config in TESSERACT_CONFIGS:
+        try:
+            text = pytesseract.image_to_string(img, config=config).strip()
+
+            # Extract number
+            match = re.search(r'\d+', text)
+            if match:
+                value = int(match.group())
+                digits = len(str(value))
+
+                if required_digits is None or digits == required_digits:
+                    return value
+        except Exception as e:
+            print(f"OCR failed with config {config}: {e}")
+            continue
+    return None
+
+
+def frame_digest(frame: np.ndarray) -> bytes:
+    """Fast content hash of a frame's pixels and shape."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr(frame.shape).encode())
+    h.update(np.ascontiguousarray(frame).data)
+    return h.digest()
+
+
+class OcrCache:
+    """LRU of OCR results keyed by the captured pixels.
+
+    Identical pixels (e.g. the home screen after an aborted attack) never
+    reach the OCR engine twice. Failed reads (None) are not stored, so the
+    same pixels get another try. hits and misses are kept for tuning.
+    """
+
+    def __init__(self, maxsize: int = 32) -> None:
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Tuple[bytes, Optional[int]], int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, frame: np.ndarray, required_digits: Optional[int],
+               compute: Callable[[], Optional[int]]) -> Optional[int]:
+        """Cached result for these pixels, computing it on a miss and storing it if the read succeeded."""
+        key = (frame_digest(frame), required_digits)
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+        value = compute()
+        if value is None:
+            return None
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries),
+                "hit_rate": self.hits / total if total else 0.0}
+
+
+def load_labelled_samples(folder: str) -> List[Tuple[np.ndarray, str]]:
+    """(RGB array, label) for every image in folder whose name starts with digits."""
+    from PIL import Image
+
+    samples = []
+    for name in sorted(os.listdir(folder)):
+        match = re.match(r"(\d+)", name)
+        if not match:
+            continue
+        with Image.open(os.path.join(folder, name)) as img:
+            samples.append((np.asarray(img.convert("RGB")), match.group(1)))
+    return samples
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "build":
+        print("usage: python ocr.py build <labelled sample folder> <output .npz>")
+        sys.exit(2)
+    samples = load_labelled_samples(sys.argv[2])
+    recognizer = DigitRecognizer.from_samples(samples)
+    recognizer.save(sys.argv[3])
+    print(f"Built digit templates from {len(samples)} samples -> {sys.argv[3]}")
@@ -0,0 +1,71 @@
+"""Deadline scheduling on the monotonic clock.
+
+Sleeping a fixed delay before every action lets each action's own cost
+(capture, click, logging) pile up, so a long deployment drifts well past
+its intended length. DeadlineScheduler instead keeps one absolute
+deadline per action measured from the start of the sequence, sleeps only
+whatever time is left and records how late each action started.
+"""
+import statistics
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class DeadlineScheduler:
+    """Absolute per-action deadlines from a single start time."""
+
+    def __init__(self, clock: Optional[Callable[[], float]] = None,
+                 sleep: Optional[Callable[[float], None]] = None) -> None:
+        # None means time.monotonic/time.sleep, resolved on each call
+        self._clock = clock
+        self._sleep = sleep
+        self.started: Optional[float] = None
+        self.deadline: Optional[float] = None
+        self.records: List[Tuple[str, float]] = []
+
+    def clock(self) -> float:
+        return self._clock() if self._clock is not None else time.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        if self._sleep is not None:
+            self._sleep(seconds)
+        else:
+            time.sleep(seconds)
+
+    def start(self) -> None:
+        self.started = self.deadline = self.clock()
+        self.records = []
+
+    def wait(self, delay: float, label: str = "") -> float:
+        """Sleep until delay seconds after the previous deadline; returns lateness."""
+        if self.deadline is None:
+            self.start()
+        self.deadline += delay
+        remaining = self.deadline - self.clock()
+        if remaining > 0:
+            self.sleep(remaining)
+        late = max(self.clock() - self.deadline, 0.0)
+        self.records.append((label, late))
+        return late
+
+    def advance(self, delay: float) -> None:
+        """Move the deadline on without waiting, for time spent inside a burst."""
+        if self.deadline is None:
+            self.start()
+        self.deadline += delay
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Lateness per label in milliseconds, plus the overall overrun."""
+        by_label: Dict[str, List[float]] = {}
+        for label, late in self.records:
+            by_label.setdefault(label, []).append(late)
+        out = {
+            label: {"count": len(v), "mean_ms": statistics.fmean(v) * 1000, "max_ms": max(v) * 1000}
+            for label, v in by_label.items()
+        }
+        if self.started is not None and self.deadline is not None:
+            out["total"] = {
+                "planned_s": self.deadline - self.started,
+                "actual_s": self.clock() - self.started,
+            }
+        return out
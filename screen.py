@@ -0,0 +1,443 @@
+"""Shared screen capture for the bot scripts.
+
+One CaptureEngine lives per process and owns a single long-lived backend
+(mss by default). Grabs are kept for a short TTL so several probes in the
+same tick are answered from one grab instead of one grab each.
+"""
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# (left, top, width, height)
+Region = Tuple[int, int, int, int]
+
+# How long a grab may be reused by later probes, in seconds
+DEFAULT_TTL = 0.02
+
+# Covering region area per probe above which a ProbeSet grabs each point's
+# own box instead; a 64x64 square each
+SPARSE_AREA = 64 * 64
+
+
+def frame_from_raw(raw, width: int, height: int) -> np.ndarray:
+    """Read-only (height, width, 4) BGRA view over a raw buffer, no copy."""
+    frame = np.frombuffer(raw, dtype=np.uint8).reshape(height, width, 4)
+    frame.flags.writeable = False
+    return frame
+
+
+def to_pil_rgb(frame: np.ndarray):
+    """PIL RGB image decoded straight from a BGRA frame.
+
+    PIL's raw BGRX decoder drops alpha and swaps channels while reading, so
+    the only copy made is the image's own storage.
+    """
+    from PIL import Image
+    height, width = frame.shape[:2]
+    if not frame.flags.c_contiguous:
+        frame = np.ascontiguousarray(frame)
+    return Image.frombuffer("RGB", (width, height), frame, "raw", "BGRX", 0, 1)
+
+
+class CaptureBackend:
+    """Source of BGRA frames. Subclass and implement grab()."""
+
+    def grab(self, region: Region) -> np.ndarray:
+        """Return an (height, width, 4) uint8 BGRA array for region.
+
+        Frames are treated as read-only; callers index rather than copy.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class MssBackend(CaptureBackend):
+    """Real screen via mss, one mss instance per thread, opened once."""
+
+    def __init__(self) -> None:
+        import mss
+        self._mss = mss
+        self._local = threading.local()
+
+    def _sct(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = self._mss.mss()
+            self._local.sct = sct
+        return sct
+
+    def grab(self, region: Region) -> np.ndarray:
+        left, top, width, height = region
+        shot = self._sct().grab({"left": left, "top": top, "width": width, "height": height})
+        # Each grab owns a fresh bytearray, so viewing it is safe
+        return frame_from_raw(shot.raw, shot.width, shot.height)
+
+    def close(self) -> None:
+        sct = getattr(self._local, "sct", None)
+        if sct is not None:
+            sct.close()
+            self._local.sct = None
+
+
+class SyntheticBackend(CaptureBackend):
+    """Frames from a callable or a fixed array, for tests and offline runs.
+
+    source is either a full-screen BGRA array or a callable returning one.
+    RGB arrays are accepted and padded with an opaque alpha channel.
+    """
+
+    def __init__(self, source) -> None:
+        self.source = source
+        self.grabs = 0
+
+    def screen(self) -> np.ndarray:
+        frame = self.source() if callable(self.source) else self.source
+        if frame.shape[2] == 3:
+            alpha = np.full(frame.shape[:2] + (1,), 255, dtype=np.uint8)
+            frame = np.concatenate([frame[:, :, ::-1], alpha], axis=2)
+        return frame
+
+    def grab(self, region: Region) -> np.ndarray:
+        self.grabs += 1
+        left, top, width, height = region
+        frame = self.screen()[top:top + height, left:left + width].view()
+        frame.flags.writeable = False
+        return frame
+
+
+def rgb_frame(width: int, height: int, rgb: Tuple[int, int, int] = (0, 0, 0)) -> np.ndarray:
+    """Solid BGRA frame, handy as a SyntheticBackend source."""
+    frame = np.empty((height, width, 4), dtype=np.uint8)
+    frame[:, :] = (rgb[2], rgb[1], rgb[0], 255)
+    return frame
+
+
+class CaptureEngine:
+    """Process-wide capture with a short-TTL cache of recent grabs.
+
+    A request is served from cache if a grab newer than ttl fully contains
+    the requested region; otherwise the backend is hit once and the result
+    is remembered.
+    """
+
+    def __init__(self, backend: Optional[CaptureBackend] = None, ttl: float = DEFAULT_TTL,
+                 clock: Optional[Callable[[], float]] = None, max_entries: int = 8) -> None:
+        self._backend = backend
+        self.ttl = ttl
+        self.clock = clock
+        self.max_entries = max_entries
+        self._cache: List[Tuple[float, Region, np.ndarray]] = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def backend(self) -> CaptureBackend:
+        if self._backend is None:
+            self._backend = MssBackend()
+        return self._backend
+
+    def set_backend(self, backend: CaptureBackend) -> None:
+        with self._lock:
+            if self._backend is not None:
+                self._backend.close()
+            self._backend = backend
+            self._cache.clear()
+
+    def invalidate(self) -> None:
+        """Drop cached grabs, e.g. right after a click changed the screen."""
+        with self._lock:
+            self._cache.clear()
+
+    def grab(self, region: Region, max_age: Optional[float] = None) -> np.ndarray:
+        """BGRA pixels for region, reusing a fresh cached grab when possible."""
+        max_age = self.ttl if max_age is None else max_age
+        left, top, width, height = region
+        now = self.clock() if self.clock is not None else time.monotonic()
+        with self._lock:
+            self._cache = [e for e in self._cache if now - e[0] <= max_age]
+            for _, (cl, ct, cw, ch), frame in self._cache:
+                if cl <= left and ct <= top and left + width <= cl + cw and top + height <= ct + ch:
+                    self.hits += 1
+                    return frame[top - ct:top - ct + height, left - cl:left - cl + width]
+            self.misses += 1
+        frame = self.backend.grab(region)
+        with self._lock:
+            self._cache.append((now, region, frame))
+            del self._cache[:-self.max_entries]
+        return frame
+
+    def pixel_rgb(self, point: Tuple[int, int]) -> Tuple[int, int, int]:
+        b, g, r = self.grab((point[0], point[1], 1, 1))[0, 0, :3]
+        return (int(r), int(g), int(b))
+
+    def close(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            if self._backend is not None:
+                self._backend.close()
+
+
+def color_distance(samples: np.ndarray, expected: np.ndarray, metric: str = "channel") -> np.ndarray:
+    """Distance between colours along the last axis.
+
+    metric "channel" is the largest per-channel difference, "euclidean"
+    the straight-line distance in RGB space. Works on any broadcastable
+    shapes, so whole buffers are compared in one call.
+    """
+    diff = np.asarray(samples, dtype=np.float32) - np.asarray(expected, dtype=np.float32)
+    if metric == "channel":
+        return np.abs(diff).max(axis=-1)
+    if metric == "euclidean":
+        return np.sqrt((diff * diff).sum(axis=-1))
+    raise ValueError(f"Unknown colour metric: {metric}")
+
+
+def colors_match(samples: np.ndarray, expected: np.ndarray, tolerance: float = 0,
+                 metric: str = "channel") -> np.ndarray:
+    """True where samples are within tolerance of expected."""
+    return color_distance(samples, expected, metric) <= tolerance
+
+
+class Probe(NamedTuple):
+    """A pixel that should (present=True) or should not show rgb.
+
+    tolerance is the allowed colour distance under metric ("channel" or
+    "euclidean"). patch > 0 averages a (2*patch+1)^2 square around the
+    point before comparing, which smooths out compression noise.
+    """
+    point: Tuple[int, int]
+    rgb: Tuple[int, int, int]
+    present: bool = True
+    tolerance: float = 0
+    metric: str = "channel"
+    patch: int = 0
+
+
+class ProbeSet:
+    """Named pixel conditions checked together from one grab.
+
+    The smallest region covering every point is grabbed once and all
+    conditions are evaluated in a single NumPy comparison, so watching
+    many pixels costs about the same as watching one. Points spread across
+    the screen (sparse) are grabbed one small box each instead, which is
+    far less than their mostly empty covering region.
+    """
+
+    def __init__(self, probes: Dict[str, Probe], engine: Optional[CaptureEngine] = None) -> None:
+        if not probes:
+            raise ValueError("ProbeSet needs at least one probe")
+        self.engine = engine
+        self.names = list(probes)
+        specs = [Probe(*p) for p in probes.values()]
+        for p in specs:
+            if p.metric not in ("channel", "euclidean"):
+                raise ValueError(f"Unknown colour metric: {p.metric}")
+        pad = max(p.patch for p in specs)
+        xs = np.array([p.point[0] for p in specs])
+        ys = np.array([p.point[1] for p in specs])
+        left, top = max(int(xs.min()) - pad, 0), max(int(ys.min()) - pad, 0)
+        right, bottom = int(xs.max()) + pad + 1, int(ys.max()) + pad + 1
+        self.region: Region = (left, top, right - left, bottom - top)
+        self._xs = xs - left
+        self._ys = ys - top
+        # Stored BGR to match the captured buffer
+        self._expected = np.array([p.rgb[::-1] for p in specs], dtype=np.float32)
+        self._present = np.array([p.present for p in specs])
+        self._tolerance = np.array([p.tolerance for p in specs], dtype=np.float32)
+        self._euclidean = np.array([p.metric == "euclidean" for p in specs])
+        self._patch_weights = None
+        if pad:
+            # Offsets for the largest patch; smaller patches zero-weight the rim
+            dy, dx = np.mgrid[-pad:pad + 1, -pad:pad + 1]
+            dy, dx = dy.ravel(), dx.ravel()
+            radius = np.array([p.patch for p in specs])[:, None]
+            inside = (np.abs(dy) <= radius) & (np.abs(dx) <= radius)
+            self._patch_weights = inside / inside.sum(axis=1, keepdims=True)
+            self._xs = np.clip(self._xs[:, None] + dx, 0, self.region[2] - 1)
+            self._ys = np.clip(self._ys[:, None] + dy, 0, self.region[3] - 1)
+        self.sparse = self.region[2] * self.region[3] > SPARSE_AREA * len(specs)
+        self._boxes: List[Region] = []
+        for p in specs:
+            x0, y0 = max(p.point[0] - p.patch, 0), max(p.point[1] - p.patch, 0)
+            self._boxes.append((x0, y0, p.point[0] + p.patch + 1 - x0, p.point[1] + p.patch + 1 - y0))
+
+    def colors(self, frame: Optional[np.ndarray] = None) -> np.ndarray:
+        """(N, 3) BGR samples at each probe point, patch-averaged if asked.
+
+        frame covers self.region; without one a fresh grab is taken, box by
+        box if the set is sparse.
+        """
+        if frame is None and self.sparse:
+            engine = self.engine or get_engine()
+            return np.array([engine.grab(box)[:, :, :3].reshape(-1, 3).mean(axis=0) for box in self._boxes],
+                            dtype=np.float32)
+        if frame is None:
+            frame = (self.engine or get_engine()).grab(self.region)
+        samples = frame[self._ys, self._xs, :3]
+        if self._patch_weights is not None:
+            samples = np.einsum("nk,nkc->nc", self._patch_weights, samples.astype(np.float32))
+        return samples
+
+    def distances(self, frame: Optional[np.ndarray] = None, colors: Optional[np.ndarray] = None) -> np.ndarray:
+        """Colour distance of each probe from its expected colour.
+
+        colors, samples already taken by colors(), stands in for frame.
+        """
+        if colors is None:
+            colors = self.colors(frame)
+        diff = np.asarray(colors, dtype=np.float32) - self._expected
+        return np.where(self._euclidean, np.sqrt((diff * diff).sum(axis=1)), np.abs(diff).max(axis=1))
+
+    def evaluate(self, frame: Optional[np.ndarray] = None, colors: Optional[np.ndarray] = None) -> np.ndarray:
+        """Boolean array, True where a probe's condition holds."""
+        match = self.distances(frame, colors) <= self._tolerance
+        return match == self._present
+
+    def fired(self, frame: Optional[np.ndarray] = None) -> List[str]:
+        """Names of the probes whose condition currently holds, in order."""
+        return [name for name, hit in zip(self.names, self.evaluate(frame)) if hit]
+
+    def wait_any(self, timeout: Optional[float] = None, **kwargs) -> "WaitResult":
+        """Wait until at least one probe fires; value is the fired names."""
+        return wait_for(self.fired, timeout=timeout, **kwargs)
+
+
+class WaitResult(NamedTuple):
+    """Outcome of wait_for: whether it fired, how long it took, and the last check value."""
+    ok: bool
+    elapsed: float
+    polls: int
+    value: object = None
+
+
+def wait_for(check: Callable[[], object], timeout: Optional[float] = None,
+             min_interval: float = DEFAULT_TTL, max_interval: float = 0.25, backoff: float = 1.5,
+             clock: Optional[Callable[[], float]] = None,
+             sleep: Optional[Callable[[float], None]] = None) -> WaitResult:
+    """Poll check() until it returns something truthy or timeout expires.
+
+    Polling starts at min_interval, right after an action when the screen
+    is most likely to change, and backs off geometrically to max_interval
+    for long phases such as searches and battles. Sleeps never overrun the
+    deadline. timeout=None waits forever. clock and sleep default to the
+    time module's, looked up per call so a simulator can swap them.
+    """
+    clock = clock or time.monotonic
+    sleep = sleep or time.sleep
+    start = clock()
+    deadline = None if timeout is None else start + timeout
+    interval = min_interval
+    polls = 0
+    while True:
+        value = check()
+        polls += 1
+        now = clock()
+        if value:
+            return WaitResult(True, now - start, polls, value)
+        if deadline is not None and now >= deadline:
+            return WaitResult(False, now - start, polls, value)
+        pause = interval if deadline is None else min(interval, deadline - now)
+        sleep(pause)
+        interval = min(interval * backoff, max_interval)
+
+
+
+class ChangeDetector:
+    """Notices when a region of the screen changes, or stops changing.
+
+    The region is sampled every step pixels in both directions and
+    compared with a reference sample by mean absolute difference over the
+    colour channels (0-255 scale), so a whole scene transition is judged
+    from a few thousand pixels rather than one.
+    """
+
+    def __init__(self, region: Region, step: int = 8, threshold: float = 8.0,
+                 engine: Optional[CaptureEngine] = None) -> None:
+        self.region = region
+        self.step = step
+        self.threshold = threshold
+        self.engine = engine
+        self.reference: Optional[np.ndarray] = None
+
+    def sample(self, frame: Optional[np.ndarray] = None) -> np.ndarray:
+        """Downsampled float32 BGR copy of the region (or of frame, already cropped to it)."""
+        if frame is None:
+            frame = (self.engine or get_engine()).grab(self.region)
+        return frame[::self.step, ::self.step, :3].astype(np.float32)
+
+    def reset(self, frame: Optional[np.ndarray] = None) -> None:
+        """Take the current screen as the reference."""
+        self.reference = self.sample(frame)
+
+    def difference(self, frame: Optional[np.ndarray] = None) -> float:
+        """Mean absolute difference from the reference, taking one first if there is none."""
+        current = self.sample(frame)
+        if self.reference is None:
+            self.reference = current
+            return 0.0
+        return float(np.abs(current - self.reference).mean())
+
+    def changed(self, frame: Optional[np.ndarray] = None) -> bool:
+        return self.difference(frame) > self.threshold
+
+    def wait_changed(self, timeout: Optional[float] = None, reset: bool = True, **kwargs) -> WaitResult:
+        """Wait until the region differs from the reference by more than threshold.
+
+        reset=True takes the reference now; pass False to keep one taken
+        earlier, e.g. before the click that should trigger the change.
+        value is the last difference.
+        """
+        if reset or self.reference is None:
+            self.reset()
+        last = [0.0]
+
+        def check():
+            last[0] = self.difference()
+            return last[0] > self.threshold
+
+        return wait_for(check, timeout=timeout, **kwargs)._replace(value=last[0])
+
+    def wait_stable(self, timeout: Optional[float] = None, polls: int = 2, **kwargs) -> WaitResult:
+        """Wait until polls consecutive samples each differ from the one before by at most threshold.
+
+        Useful after a transition, to let fades and animations settle
+        before acting. value is the last difference.
+        """
+        self.reset()
+        quiet = [0]
+        last = [0.0]
+
+        def check():
+            current = self.sample()
+            last[0] = float(np.abs(current - self.reference).mean())
+            self.reference = current
+            quiet[0] = quiet[0] + 1 if last[0] <= self.threshold else 0
+            return quiet[0] >= polls
+
+        return wait_for(check, timeout=timeout, **kwargs)._replace(value=last[0])
+
+
+_engine: Optional[CaptureEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> CaptureEngine:
+    """The process-wide CaptureEngine, created on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = CaptureEngine()
+    return _engine
+
+
+def set_backend(backend: CaptureBackend) -> CaptureEngine:
+    """Swap the capture source of the shared engine (e.g. a SyntheticBackend)."""
+    engine = get_engine()
+    engine.set_backend(backend)
+    return engine
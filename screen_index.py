@@ -0,0 +1,211 @@
+"""Perceptual-hash index of labelled screenshots.
+
+Every screenshot is reduced to a dHash (brightness gradients of a tiny
+greyscale thumbnail) or a pHash (signs of the low DCT frequencies), and
+the bits are packed into bytes. Lookups XOR the query against every row
+and count bits, so hundreds of screens are searched in one NumPy pass.
+
+The index is a folder holding hashes.npy and labels.npy, opened with
+memory mapping so loading costs the same however many screens it holds,
+plus index.json with the label names and hash settings:
+
+    python screen_index.py build <screenshot folder> screen_index [--kind phash] [--size 8]
+    python screen_index.py query screen_index <screenshot>
+
+Screenshots are named "<state>-<anything>.png", as for screen_state.
+"""
+import argparse
+import functools
+import json
+import os
+import sys
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from screen import CaptureEngine, get_engine
+from screen_state import SCREEN_REGION, UNKNOWN, iter_labelled_screens
+
+HASH_KINDS = ("dhash", "phash")
+
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else:
+    # NumPy < 2.0: per-byte lookup table
+    _POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+
+    def _popcount(values: np.ndarray) -> np.ndarray:
+        return _POPCOUNT[values]
+
+
+def _grey_thumbnail(frame: np.ndarray, rows: int, cols: int) -> np.ndarray:
+    """(rows, cols) float32 luma of a BGRA frame, each cell the mean of its block.
+
+    The frame is first subsampled to about 8 pixels per cell side, so a
+    full-screen frame costs a few thousand pixel reads.
+    """
+    height, width = frame.shape[:2]
+    step = max(1, min(height // (rows * 8), width // (cols * 8)))
+    small = frame[::step, ::step, :3].astype(np.float32)
+    grey = small[:, :, 2] * 0.299 + small[:, :, 1] * 0.587 + small[:, :, 0] * 0.114
+    ys = (np.arange(rows) * grey.shape[0]) // rows
+    xs = (np.arange(cols) * grey.shape[1]) // cols
+    sums = np.add.reduceat(np.add.reduceat(grey, ys, axis=0), xs, axis=1)
+    counts = np.diff(np.append(ys, grey.shape[0]))[:, None] * np.diff(np.append(xs, grey.shape[1]))[None, :]
+    return sums / counts
+
+
+@functools.lru_cache(maxsize=4)
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, so a 2-D DCT is two matrix products."""
+    k = np.arange(n)[:, None]
+    basis = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    basis[0] /= np.sqrt(2)
+    return basis.astype(np.float32)
+
+
+def dhash(frame: np.ndarray, size: int = 8) -> np.ndarray:
+    """size*size-bit difference hash, packed into uint8."""
+    thumb = _grey_thumbnail(frame, size, size + 1)
+    return np.packbits(thumb[:, 1:] > thumb[:, :-1])
+
+
+def phash(frame: np.ndarray, size: int = 8) -> np.ndarray:
+    """size*size-bit DCT hash of a 4*size square thumbnail, packed into uint8."""
+    n = size * 4
+    basis = _dct_matrix(n)
+    low = (basis @ _grey_thumbnail(frame, n, n) @ basis.T)[:size, :size].ravel()
+    # The DC term is overall brightness; leave it out of the median
+    return np.packbits(low > np.median(low[1:]))
+
+
+def hamming(hashes: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Bit distance from query to every row of a packed (N, bytes) hash array."""
+    return _popcount(np.bitwise_xor(hashes, query)).sum(axis=1, dtype=np.int32)
+
+
+class Match(NamedTuple):
+    label: str
+    distance: int
+    file: str = ""
+
+
+class ScreenIndex:
+    """Packed perceptual hashes with a label per row."""
+
+    def __init__(self, hashes: np.ndarray, label_ids: np.ndarray, labels: List[str], kind: str = "dhash",
+                 size: int = 8, files: Optional[List[str]] = None, max_distance: Optional[int] = None) -> None:
+        if kind not in HASH_KINDS:
+            raise ValueError(f"Unknown hash kind: {kind}")
+        self.hashes = hashes
+        self.label_ids = label_ids
+        self.labels = labels
+        self.kind = kind
+        self.size = size
+        self.files = files or [""] * len(label_ids)
+        # Default: a quarter of the bits may differ
+        self.max_distance = size * size // 4 if max_distance is None else max_distance
+
+    def __len__(self) -> int:
+        return len(self.label_ids)
+
+    def hash(self, frame: np.ndarray) -> np.ndarray:
+        return dhash(frame, self.size) if self.kind == "dhash" else phash(frame, self.size)
+
+    def nearest(self, frame: np.ndarray, k: int = 1) -> List[Match]:
+        """The k closest screenshots, nearest first."""
+        dist = hamming(self.hashes, self.hash(frame))
+        k = min(k, len(dist))
+        order = np.argpartition(dist, k - 1)[:k]
+        order = order[np.argsort(dist[order], kind="stable")]
+        return [Match(self.labels[self.label_ids[i]], int(dist[i]), self.files[i]) for i in order]
+
+    def lookup(self, frame: np.ndarray) -> Match:
+        """Nearest screenshot's label, or UNKNOWN if it is further than max_distance bits."""
+        if not len(self):
+            return Match(UNKNOWN, self.size * self.size)
+        best = self.nearest(frame)[0]
+        return best if best.distance <= self.max_distance else best._replace(label=UNKNOWN)
+
+    def identify(self, engine: Optional[CaptureEngine] = None) -> Match:
+        """Look up the current screen from one grab."""
+        return self.lookup((engine or get_engine()).grab(SCREEN_REGION))
+
+    @classmethod
+    def build(cls, folder: str, kind: str = "dhash", size: int = 8) -> "ScreenIndex":
+        """Hash every labelled screenshot in folder, decoding one image at a time."""
+        hash_fn = dhash if kind == "dhash" else phash
+        labels: List[str] = []
+        rows, ids, files = [], [], []
+        for frame, label, name in iter_labelled_screens(folder):
+            if label not in labels:
+                labels.append(label)
+            rows.append(hash_fn(frame, size))
+            ids.append(labels.index(label))
+            files.append(name)
+        hashes = np.stack(rows) if rows else np.zeros((0, (size * size + 7) // 8), dtype=np.uint8)
+        return cls(hashes, np.array(ids, dtype=np.int32), labels, kind, size, files)
+
+    def save(self, folder: str) -> None:
+        os.makedirs(folder, exist_ok=True)
+        np.save(os.path.join(folder, "hashes.npy"), np.ascontiguousarray(self.hashes))
+        np.save(os.path.join(folder, "labels.npy"), np.asarray(self.label_ids, dtype=np.int32))
+        with open(os.path.join(folder, "index.json"), "w") as f:
+            json.dump({"kind": self.kind, "size": self.size, "max_distance": self.max_distance,
+                       "labels": self.labels, "files": self.files}, f, indent=1)
+
+    @classmethod
+    def load(cls, folder: str) -> "ScreenIndex":
+        """Open an index with its arrays memory-mapped read-only."""
+        with open(os.path.join(folder, "index.json")) as f:
+            meta = json.load(f)
+        hashes = np.load(os.path.join(folder, "hashes.npy"), mmap_mode="r")
+        label_ids = np.load(os.path.join(folder, "labels.npy"), mmap_mode="r")
+        return cls(hashes, label_ids, meta["labels"], meta["kind"], meta["size"], meta.get("files"),
+                   meta.get("max_distance"))
+
+
+def load_screen_index(folder: str) -> Optional[ScreenIndex]:
+    """ScreenIndex from folder, or None if no index has been built yet."""
+    if not os.path.exists(os.path.join(folder, "index.json")):
+        return None
+    try:
+        return ScreenIndex.load(folder)
+    except Exception as e:
+        print(f"Could not load screen index from {folder}: {e}")
+        return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build or query a perceptual-hash index of labelled screenshots.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build")
+    build.add_argument("folder")
+    build.add_argument("index")
+    build.add_argument("--kind", choices=HASH_KINDS, default="dhash")
+    build.add_argument("--size", type=int, default=8, help="hash is size*size bits")
+    query = sub.add_parser("query")
+    query.add_argument("index")
+    query.add_argument("image")
+    query.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        index = ScreenIndex.build(args.folder, args.kind, args.size)
+        index.save(args.index)
+        print(f"Indexed {len(index)} screenshots of {len(index.labels)} screens -> {args.index}")
+        return 0
+
+    from PIL import Image
+    from screen import SyntheticBackend
+
+    index = ScreenIndex.load(args.index)
+    with Image.open(args.image) as img:
+        frame = SyntheticBackend(np.asarray(img.convert("RGB"))).screen()
+    for match in index.nearest(frame, args.k):
+        print(f"{match.label:<24} {match.distance:>3} bits  {match.file}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""Whole-screen state detection.
+
+A frame is reduced to a fingerprint, the colours of a fixed GRID of
+points spread over the screen (a few hundred pixel reads, not a resize),
+and compared against one signature per known screen by mean absolute
+difference. States can also carry sentinel probes, the pixels the bots
+have always checked; a state is only reported when its sentinels hold,
+which separates screens that differ in one small button. Without built
+signatures the classifier runs on sentinels alone.
+
+Signatures come from labelled screenshots named "<state>-<anything>.png":
+
+    python screen_state.py build <screenshot folder> screen_signatures.npz
+"""
+import functools
+import os
+import sys
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from screen import CaptureEngine, Probe, ProbeSet, Region, SyntheticBackend, WaitResult, get_engine, wait_for
+
+# Fingerprint sample grid (columns, rows)
+GRID = (32, 18)
+
+SCREEN_REGION: Region = (0, 0, 1920, 1080)
+
+UNKNOWN = "unknown"
+
+
+@functools.lru_cache(maxsize=8)
+def _grid_points(height: int, width: int, grid: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    cols, rows = grid
+    xs = ((np.arange(cols) + 0.5) * width / cols).astype(np.intp)
+    ys = ((np.arange(rows) + 0.5) * height / rows).astype(np.intp)
+    return ys[:, None], xs[None, :]
+
+
+def fingerprint(frame: np.ndarray, grid: Tuple[int, int] = GRID) -> np.ndarray:
+    """(rows, cols, 3) float32 BGR samples of frame at the centre of each grid cell."""
+    ys, xs = _grid_points(frame.shape[0], frame.shape[1], tuple(grid))
+    return frame[ys, xs, :3].astype(np.float32)
+
+
+class Detection(NamedTuple):
+    """Detected state and its mean absolute difference from that state's signature (0 without one)."""
+    state: str
+    distance: float = 0.0
+
+
+class ScreenClassifier:
+    """Nearest known screen for a frame, gated by each state's sentinel probes.
+
+    sentinels maps state -> probes that must all hold; signatures maps
+    state -> fingerprint. A state needs at least one of the two. When
+    several states qualify the one with more sentinels wins (it is the
+    more specific screen), then the closer signature. Anything further
+    than max_distance from every signature, or failing its sentinels, is
+    UNKNOWN.
+    """
+
+    def __init__(self, sentinels: Optional[Dict[str, Sequence[Probe]]] = None,
+                 signatures: Optional[Dict[str, np.ndarray]] = None, max_distance: float = 12.0,
+                 grid: Tuple[int, int] = GRID, region: Region = SCREEN_REGION,
+                 engine: Optional[CaptureEngine] = None) -> None:
+        sentinels = sentinels or {}
+        signatures = signatures or {}
+        self.states = list(dict.fromkeys([*sentinels, *signatures]))
+        if not self.states:
+            raise ValueError("ScreenClassifier needs sentinels or signatures")
+        self.max_distance = max_distance
+        self.grid = grid
+        self.region = region
+        self.engine = engine
+        self._has_signature = np.array([s in signatures for s in self.states])
+        self._signatures = np.stack([
+            np.asarray(signatures[s], dtype=np.float32) if s in signatures
+            else np.zeros((grid[1], grid[0], 3), dtype=np.float32)
+            for s in self.states
+        ])
+        # All sentinels in one ProbeSet; _owner maps each probe back to its state
+        probes = {f"{s}:{i}": p for s in self.states for i, p in enumerate(sentinels.get(s, ()))}
+        self._probes = ProbeSet(probes, engine) if probes else None
+        self._owner = np.array([self.states.index(name.rsplit(":", 1)[0]) for name in probes], dtype=np.intp)
+        self._sentinel_count = np.bincount(self._owner, minlength=len(self.states))
+
+    def distances(self, frame: np.ndarray) -> np.ndarray:
+        """Mean absolute difference of frame's fingerprint from every signature (inf where none)."""
+        fp = fingerprint(frame, self.grid)
+        dist = np.abs(self._signatures - fp).mean(axis=(1, 2, 3))
+        return np.where(self._has_signature, dist, np.inf)
+
+    def classify(self, frame: np.ndarray) -> Detection:
+        """Detection for a BGRA frame of self.region; sentinel points are screen coordinates."""
+        dist = self.distances(frame) if self._has_signature.any() else np.full(len(self.states), np.inf)
+        matched = None
+        if self._probes is not None:
+            x, y, w, h = self._probes.region
+            x, y = x - self.region[0], y - self.region[1]
+            matched = self._probes.evaluate(frame[y:y + h, x:x + w])
+        return self._decide(dist, matched)
+
+    def _decide(self, dist: np.ndarray, matched: Optional[np.ndarray]) -> Detection:
+        """Detection from signature distances and which sentinel probes held."""
+        ok = np.where(self._has_signature, dist <= self.max_distance, True)
+        if matched is not None:
+            hits = np.bincount(self._owner, weights=matched, minlength=len(self.states))
+            ok &= hits == self._sentinel_count
+        ok &= self._has_signature | (self._sentinel_count > 0)
+        if not ok.any():
+            return Detection(UNKNOWN, float(dist.min()))
+        candidates = np.flatnonzero(ok)
+        best = min(candidates, key=lambda i: (-self._sentinel_count[i], dist[i]))
+        return Detection(self.states[best], float(dist[best]) if self._has_signature[best] else 0.0)
+
+    def sample(self) -> np.ndarray:
+        """One grab of what classification needs, for classify_sample().
+
+        That is the frame of self.region when signatures are loaded. With
+        sentinels alone there is nothing to fingerprint, so only the probes
+        are grabbed and their colours returned instead.
+        """
+        if self._has_signature.any():
+            return (self.engine or get_engine()).grab(self.region)
+        return self._probes.colors()
+
+    def classify_sample(self, sample: np.ndarray) -> Detection:
+        """Detection for the result of sample()."""
+        if self._has_signature.any():
+            return self.classify(sample)
+        return self._decide(np.full(len(self.states), np.inf), self._probes.evaluate(colors=sample))
+
+    def detect(self) -> Detection:
+        """Classify the current screen from one grab."""
+        return self.classify_sample(self.sample())
+
+    def wait_state(self, states: Optional[Iterable[str]] = None, exclude: Iterable[str] = (),
+                   timeout: Optional[float] = None, **kwargs) -> WaitResult:
+        """Wait until a known state is showing: one of states if given, never one in exclude.
+
+        value is the last Detection, so a timeout still says what was on screen.
+        """
+        wanted = set(states) if states is not None else None
+        skip = set(exclude) | {UNKNOWN}
+        last = [Detection(UNKNOWN)]
+
+        def check():
+            last[0] = found = self.detect()
+            return found.state not in skip and (wanted is None or found.state in wanted)
+
+        result = wait_for(check, timeout=timeout, **kwargs)
+        return result._replace(value=last[0])
+
+    @classmethod
+    def from_frames(cls, samples: Iterable[Tuple[np.ndarray, str]],
+                    sentinels: Optional[Dict[str, Sequence[Probe]]] = None, **kwargs) -> "ScreenClassifier":
+        """Average the fingerprints of labelled BGRA frames into one signature per state."""
+        grid = kwargs.get("grid", GRID)
+        sums: Dict[str, np.ndarray] = {}
+        counts: Dict[str, int] = {}
+        for frame, label in samples:
+            sums[label] = sums.get(label, 0) + fingerprint(frame, grid)
+            counts[label] = counts.get(label, 0) + 1
+        signatures = {label: sums[label] / counts[label] for label in sums}
+        return cls(sentinels, signatures, **kwargs)
+
+    def signatures(self) -> Dict[str, np.ndarray]:
+        return {s: self._signatures[i] for i, s in enumerate(self.states) if self._has_signature[i]}
+
+    def save(self, path: str) -> None:
+        sigs = self.signatures()
+        np.savez(path, labels=np.array(list(sigs)), signatures=np.stack(list(sigs.values())),
+                 max_distance=self.max_distance, grid=np.array(self.grid))
+
+    @classmethod
+    def load(cls, path: str, sentinels: Optional[Dict[str, Sequence[Probe]]] = None, **kwargs) -> "ScreenClassifier":
+        data = np.load(path)
+        signatures = dict(zip((str(label) for label in data["labels"]), data["signatures"]))
+        kwargs.setdefault("max_distance", float(data["max_distance"]))
+        kwargs.setdefault("grid", tuple(int(v) for v in data["grid"]))
+        return cls(sentinels, signatures, **kwargs)
+
+
+def load_screen_classifier(path: str, sentinels: Dict[str, Sequence[Probe]], **kwargs) -> ScreenClassifier:
+    """ScreenClassifier with signatures from path, or on sentinels alone if none have been built yet."""
+    if os.path.exists(path):
+        try:
+            return ScreenClassifier.load(path, sentinels, **kwargs)
+        except Exception as e:
+            print(f"Could not load screen signatures from {path}: {e}")
+    return ScreenClassifier(sentinels, **kwargs)
+
+
+def iter_labelled_screens(folder: str) -> Iterator[Tuple[np.ndarray, str, str]]:
+    """(BGRA frame, state, file name) for every image in folder named "<state>-<anything>.<ext>".
+
+    Screenshots are decoded one at a time, so large folders never sit in memory at once.
+    """
+    from PIL import Image
+
+    for name in sorted(os.listdir(folder)):
+        label = os.path.splitext(name)[0].split("-")[0]
+        if not label or "-" not in name:
+            continue
+        with Image.open(os.path.join(folder, name)) as img:
+            yield SyntheticBackend(np.asarray(img.convert("RGB"))).screen(), label, name
+
+
+def load_labelled_screens(folder: str) -> List[Tuple[np.ndarray, str]]:
+    """(BGRA frame, state) for every labelled screenshot in folder."""
+    return [(frame, label) for frame, label, _ in iter_labelled_screens(folder)]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "build":
+        print("usage: python screen_state.py build <labelled screenshot folder> <output .npz>")
+        sys.exit(2)
+    samples = load_labelled_screens(sys.argv[2])
+    classifier = ScreenClassifier.from_frames(samples)
+    classifier.save(sys.argv[3])
+    print(f"Built {len(classifier.states)} screen signatures from {len(samples)} screenshots -> {sys.argv[3]}")
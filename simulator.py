@@ -0,0 +1,348 @@
+"""Headless simulator for the bot loops.
+
+GameSimulator is a scripted state machine of the screens the bots walk
+through (home, attack menu, army, searching, battle, surrender prompt,
+results). It renders a frame for the current state with every sentinel
+pixel the scripts check, and advances when clicks land in the right
+boxes. Recorded screenshots can replace the synthetic frame of any state.
+
+run_script() wires a simulator into the shared capture engine and input
+injector, swaps in a virtual clock so every sleep and timeout completes
+instantly, and runs a script's main() for a number of battle cycles:
+
+    python simulator.py ValkSpammer --cycles 5
+"""
+import argparse
+import asyncio
+import importlib
+import random
+import sys
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+import attack_plan
+import input_backend
+import metrics
+import scheduler
+import screen
+import watchers
+from ocr import DigitRecognizer
+
+SCREEN_SIZE = (1920, 1080)
+
+# Synthetic background per state (RGB)
+BACKGROUNDS = {
+    "home": (70, 110, 50),
+    "attack_menu": (60, 80, 120),
+    "army": (90, 70, 60),
+    "searching": (235, 240, 245),
+    "battle": (100, 120, 70),
+    "one_star": (100, 120, 70),
+    "surrender_confirm": (50, 50, 50),
+    "results": (40, 60, 90),
+}
+
+# Sentinel patches drawn per state: (x, y) -> RGB, matching the scripts' probes
+SENTINELS = {
+    "home": {(77, 35): (33, 221, 255)},
+    "battle": {(90, 775): (247, 13, 22), (161, 776): (247, 13, 23)},
+    "one_star": {(90, 775): (247, 13, 22), (161, 776): (247, 13, 23), (1629, 809): (196, 200, 194)},
+    "results": {(900, 955): (108, 187, 31)},
+}
+
+# Click boxes (x0, x1, y0, y1) that move the game from one state to another
+TRANSITIONS = {
+    "home": [((75, 175, 900, 1000), "attack_menu")],
+    # Army screen (EDrag/Valk) or straight into a search (TrophyDropper)
+    "attack_menu": [((130, 500, 740, 860), "army"), ((1250, 1500, 600, 650), "searching")],
+    "army": [((1525, 1850, 930, 980), "searching")],
+    "battle": [((40, 220, 780, 830), "surrender_confirm")],
+    "one_star": [((40, 220, 780, 830), "surrender_confirm")],
+    "surrender_confirm": [((1000, 1320, 640, 750), "results")],
+    "results": [((840, 1080, 880, 960), "home")],
+}
+
+# 5x7 bitmap digits used to draw the trophy count
+DIGIT_FONT = {
+    "0": ["01110", "10001", "10011", "10101", "11001", "10001", "01110"],
+    "1": ["00100", "01100", "00100", "00100", "00100", "00100", "01110"],
+    "2": ["01110", "10001", "00001", "00010", "00100", "01000", "11111"],
+    "3": ["11110", "00001", "00001", "01110", "00001", "00001", "11110"],
+    "4": ["00010", "00110", "01010", "10010", "11111", "00010", "00010"],
+    "5": ["11111", "10000", "11110", "00001", "00001", "10001", "01110"],
+    "6": ["00110", "01000", "10000", "11110", "10001", "10001", "01110"],
+    "7": ["11111", "00001", "00010", "00100", "01000", "01000", "01000"],
+    "8": ["01110", "10001", "10001", "01110", "10001", "10001", "01110"],
+    "9": ["01110", "10001", "10001", "01111", "00001", "00010", "01100"],
+}
+DIGIT_SCALE = 3
+TROPHY_ORIGIN = (145, 172)
+
+
+class VirtualTime:
+    """Stand-in for the parts of the time module the bots use.
+
+    sleep() advances the clock instantly instead of blocking, so a battle
+    that takes minutes of game time runs in milliseconds.
+    """
+
+    def __init__(self, start: float = 1000.0) -> None:
+        self._now = start
+        self._lock = threading.Lock()
+        self._epoch = time.time() - start
+
+    def monotonic(self) -> float:
+        with self._lock:
+            return self._now
+
+    perf_counter = monotonic
+
+    def time(self) -> float:
+        return self.monotonic() + self._epoch
+
+    def sleep(self, seconds: float) -> None:
+        with self._lock:
+            self._now += max(seconds, 0.0)
+
+    async def async_sleep(self, seconds: float) -> None:
+        """sleep() for coroutines: advance the clock, then only yield to the loop."""
+        self.sleep(seconds)
+        await asyncio.sleep(0)
+
+    def __getattr__(self, name):
+        # strftime, localtime, ... fall through to the real module
+        return getattr(time, name)
+
+
+def render_digits(frame: np.ndarray, text: str, origin: Tuple[int, int], rgb=(255, 255, 255)) -> None:
+    """Draw text in DIGIT_FONT onto a BGRA frame in place."""
+    x, y = origin
+    for char in text:
+        glyph = np.array([[c == "1" for c in row] for row in DIGIT_FONT[char]])
+        glyph = np.kron(glyph, np.ones((DIGIT_SCALE, DIGIT_SCALE), dtype=bool))
+        h, w = glyph.shape
+        frame[y:y + h, x:x + w][glyph] = (rgb[2], rgb[1], rgb[0], 255)
+        x += w + DIGIT_SCALE
+
+
+class GameSimulator:
+    """Scripted game screens that react to clicks.
+
+    Timed transitions run on the supplied clock: a search lasts search_s,
+    and a battle ends on its own after battle_s, showing the one-star
+    surrender cue with probability one_star_chance and the results screen
+    otherwise. frames maps a state to a recorded screenshot (RGB array)
+    that replaces its synthetic frame.
+    """
+
+    def __init__(self, clock=time.monotonic, trophies: int = 3000, search_s: float = 4.0,
+                 battle_s: float = 90.0, one_star_chance: float = 0.0, trophy_loss: Tuple[int, int] = (5, 15),
+                 trophy_gain: Tuple[int, int] = (10, 30), frames: Optional[Dict[str, np.ndarray]] = None,
+                 seed: Optional[int] = None) -> None:
+        self.clock = clock
+        self.trophies = trophies
+        self.search_s = search_s
+        self.battle_s = battle_s
+        self.one_star_chance = one_star_chance
+        self.trophy_loss = trophy_loss
+        self.trophy_gain = trophy_gain
+        self.frames = {k: screen.SyntheticBackend(v).screen() for k, v in (frames or {}).items()}
+        self.rng = random.Random(seed)
+        self.state = "home"
+        self.entered = clock()
+        self.surrendered = False
+        self.cycles = 0
+        self.clicks: List[Tuple[float, str, int, int]] = []
+        self.history: List[Tuple[float, str]] = [(self.entered, "home")]
+        self.on_cycle = None
+        self._frame: Optional[np.ndarray] = None
+        self._frame_key = None
+        self._lock = threading.RLock()
+
+    def _enter(self, state: str) -> None:
+        now = self.clock()
+        if state == "results":
+            if self.surrendered:
+                self.trophies -= self.rng.randint(*self.trophy_loss)
+            else:
+                self.trophies += self.rng.randint(*self.trophy_gain)
+        if state == "battle":
+            self.surrendered = False
+        if state == "surrender_confirm":
+            self.surrendered = True
+        if self.state == "results" and state == "home":
+            self.cycles += 1
+            if self.on_cycle is not None:
+                self.on_cycle(self)
+        self.state = state
+        self.entered = now
+        self.history.append((now, state))
+
+    def tick(self) -> str:
+        """Apply timed transitions and return the current state."""
+        with self._lock:
+            elapsed = self.clock() - self.entered
+            if self.state == "searching" and elapsed >= self.search_s:
+                self._enter("battle")
+            elif self.state == "battle" and elapsed >= self.battle_s:
+                self._enter("one_star" if self.rng.random() < self.one_star_chance else "results")
+            return self.state
+
+    def click(self, x: int, y: int) -> None:
+        with self._lock:
+            state = self.tick()
+            self.clicks.append((self.clock(), state, x, y))
+            for (x0, x1, y0, y1), target in TRANSITIONS.get(state, []):
+                if x0 <= x <= x1 and y0 <= y <= y1:
+                    self._enter(target)
+                    break
+
+    def frame(self) -> np.ndarray:
+        """BGRA frame for the current state, re-rendered only when it changes."""
+        with self._lock:
+            state = self.tick()
+            key = (state, self.trophies)
+            if key != self._frame_key:
+                self._frame = self._render(state)
+                self._frame_key = key
+            return self._frame
+
+    def _render(self, state: str) -> np.ndarray:
+        if state in self.frames:
+            return self.frames[state]
+        frame = screen.rgb_frame(SCREEN_SIZE[0], SCREEN_SIZE[1], BACKGROUNDS[state])
+        for (x, y), rgb in SENTINELS.get(state, {}).items():
+            frame[y - 2:y + 3, x - 2:x + 3] = (rgb[2], rgb[1], rgb[0], 255)
+        if state == "home":
+            render_digits(frame, str(self.trophies), TROPHY_ORIGIN)
+        return frame
+
+
+def digit_recognizer() -> DigitRecognizer:
+    """Digit templates for the simulator's own font."""
+    samples = []
+    for text in ("0123", "4567", "89"):
+        frame = screen.rgb_frame(80, 30, (40, 60, 90))
+        render_digits(frame, text, (2, 2))
+        samples.append((frame, text))
+    return DigitRecognizer.from_samples(samples)
+
+
+class RunResult(NamedTuple):
+    script: str
+    cycles: int
+    sim_seconds: float
+    wall_seconds: float
+    clicks: int
+    trophies: int
+    exit_code: Optional[int]
+
+    @property
+    def battles_per_hour(self) -> float:
+        return self.cycles * 3600 / self.sim_seconds if self.sim_seconds else 0.0
+
+
+# Modules whose module-level `time` the virtual clock replaces
+_TIMED_MODULES = (screen, scheduler, attack_plan, input_backend, metrics, watchers)
+
+
+def run_script(name: str, cycles: int = 3, target: Optional[int] = None, seed: Optional[int] = 0,
+               max_sim_seconds: Optional[float] = None, **sim_kwargs) -> RunResult:
+    """Run a bot script's main() against a GameSimulator for cycles battles.
+
+    target answers TrophyDropper's prompt; its default stops after about
+    cycles surrenders. Everything the script would do to the real screen
+    and mouse goes to the simulator instead. A bot stuck on a screen it
+    does not handle is stopped after max_sim_seconds of game time
+    (default 600 per cycle).
+    """
+    module = importlib.import_module(name)
+    vtime = VirtualTime()
+    sim = GameSimulator(clock=vtime.monotonic, seed=seed, **sim_kwargs)
+
+    def on_cycle(s: GameSimulator) -> None:
+        if s.cycles >= cycles:
+            module.running = False
+
+    sim.on_cycle = on_cycle
+    engine = screen.get_engine()
+
+    def on_click(x: int, y: int) -> None:
+        sim.click(x, y)
+        engine.invalidate()
+
+    saved = {m: m.time for m in _TIMED_MODULES}
+    saved_sleep = watchers.sleep
+    saved_module = {k: getattr(module, k) for k in ("time", "keyboard", "DIGITS")}
+    saved_backend = engine._backend
+    saved_input = input_backend._injector
+    start = vtime.monotonic()
+    wall = time.perf_counter()
+    exit_code = None
+    try:
+        for m in _TIMED_MODULES:
+            m.time = vtime
+        watchers.sleep = vtime.async_sleep
+        module.time = vtime
+        module.keyboard = None
+        module.DIGITS = digit_recognizer()
+        module.running = True
+        if hasattr(module, "PLAN_SEED"):
+            module.PLAN_SEED = seed
+        if seed is not None:
+            # The navigation clicks still draw from the random module
+            random.seed(seed)
+        if target is None:
+            target = sim.trophies - 10 * cycles
+        module.input = lambda *args: str(target)
+        limit = start + (max_sim_seconds if max_sim_seconds is not None else 600.0 * cycles)
+
+        def frame() -> np.ndarray:
+            if vtime.monotonic() > limit:
+                module.running = False
+            return sim.frame()
+
+        engine._backend = screen.SyntheticBackend(frame)
+        engine.invalidate()
+        # No spin-wait: virtual sleeps land exactly on the due time
+        input_backend._injector = input_backend.ClickInjector(
+            input_backend.RecordingBackend(on_click, clock=vtime.monotonic), spin=0.0)
+        try:
+            module.main()
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else 0
+    finally:
+        input_backend._injector.close()
+        input_backend._injector = saved_input
+        engine._backend = saved_backend
+        engine.invalidate()
+        for m, t in saved.items():
+            m.time = t
+        watchers.sleep = saved_sleep
+        for k, v in saved_module.items():
+            setattr(module, k, v)
+        if "input" in module.__dict__:
+            del module.input
+    return RunResult(name, sim.cycles, vtime.monotonic() - start, time.perf_counter() - wall,
+                     len(sim.clicks), sim.trophies, exit_code)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a bot script against the headless simulator.")
+    parser.add_argument("script", choices=["EDragSpammer", "ValkSpammer", "TrophyDropper"])
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--one-star", type=float, default=0.0, help="chance a battle shows the one-star cue")
+    args = parser.parse_args()
+    result = run_script(args.script, cycles=args.cycles, seed=args.seed, one_star_chance=args.one_star)
+    print(f"{result.script}: {result.cycles} cycles, {result.clicks} clicks, "
+          f"{result.sim_seconds:.0f}s game time ({result.battles_per_hour:.1f} battles/h) "
+          f"in {result.wall_seconds:.2f}s wall, trophies now {result.trophies}"
+          + (f", exited with {result.exit_code}" if result.exit_code is not None else ""))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,384 @@
+"""Run several bot instances side by side, one process each.
+
+Every instance plays in its own emulator window, given by the window's
+origin on the desktop and its scale relative to the 1920x1080 layout the
+scripts are written for. Workers run the scripts unmodified: their
+capture and mouse backends translate every region and click on the fly.
+
+Capture is shared. The supervisor grabs the whole desktop once per tick
+into shared memory and each worker reads only the slices it asks for,
+so adding instances does not add screen grabs. Clicks from all workers
+go through one lock, so a pointer move and its click are never split by
+another instance.
+
+    python supervisor.py instances.json
+
+    {"desktop": [0, 0, 3840, 1080], "tick": 0.05,
+     "instances": [
+        {"script": "ValkSpammer", "origin": [0, 0], "scale": 0.5},
+        {"script": "TrophyDropper", "calibrate": [1920, 0, 1920, 1080], "target": 2500,
+         "set": {"METRICS_FILE": "dropper.prom"}}]}
+
+"set" overrides module-level settings of that instance's script.
+The supervisor owns the quit key, so workers run without their own
+listener. Backing out of an unknown screen still works: a worker clicks
+its own window to focus it and presses Escape while holding the click
+lock, so the key reaches that window and no other.
+"calibrate" replaces origin/scale: the window is found inside that desktop
+area by its anchors (see calibrate.py).
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+import input_backend
+import screen
+from deps import LazyModule
+from input_backend import InputBackend
+from screen import CaptureBackend, Region
+
+# Default time between desktop grabs, seconds
+DEFAULT_TICK = 0.05
+
+# Layout point clicked to focus a window before pressing a key in it; the
+# strip along the top of the game holds no buttons
+FOCUS_POINT = (960, 5)
+
+keyboard = LazyModule("pynput.keyboard")
+
+
+class Window(NamedTuple):
+    """Where an instance's game is drawn: desktop origin and scale from the 1920x1080 layout."""
+    left: int
+    top: int
+    scale: float = 1.0
+
+    def to_screen(self, x: float, y: float) -> Tuple[int, int]:
+        return int(round(self.left + x * self.scale)), int(round(self.top + y * self.scale))
+
+    def screen_region(self, region: Region) -> Region:
+        left, top, width, height = region
+        x, y = self.to_screen(left, top)
+        return x, y, max(int(round(width * self.scale)), 1), max(int(round(height * self.scale)), 1)
+
+
+class SharedFrame:
+    """The latest desktop frame in shared memory, guarded by a sequence counter.
+
+    The writer makes the counter odd while it copies a frame in and even
+    again when done; readers retry a slice whenever the counter was odd
+    or moved while they copied, so they never see half a frame.
+    """
+
+    HEADER = 64
+
+    def __init__(self, desktop: Region, name: Optional[str] = None) -> None:
+        self.desktop = desktop
+        width, height = desktop[2], desktop[3]
+        size = self.HEADER + width * height * 4
+        self._owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self._owner, size=size if self._owner else 0)
+        self._seq = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf)
+        self.frame = np.ndarray((height, width, 4), dtype=np.uint8, buffer=self.shm.buf, offset=self.HEADER)
+        if self._owner:
+            self._seq[0] = 0
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def sequence(self) -> int:
+        return int(self._seq[0])
+
+    def write(self, frame: np.ndarray) -> None:
+        self._seq[0] += 1
+        self.frame[:] = frame
+        self._seq[0] += 1
+
+    def read(self, region: Region) -> np.ndarray:
+        """Copy of region (desktop coordinates) from the latest complete frame.
+
+        Raises ValueError for a region reaching outside the desktop rather
+        than wrapping around or returning a short slice.
+        """
+        left, top, width, height = region
+        x, y = left - self.desktop[0], top - self.desktop[1]
+        if x < 0 or y < 0 or width <= 0 or height <= 0 or x + width > self.desktop[2] or y + height > self.desktop[3]:
+            raise ValueError(f"Region {region} is outside the desktop {self.desktop}")
+        while True:
+            before = self._seq[0]
+            if before & 1:
+                time.sleep(0)
+                continue
+            out = self.frame[y:y + height, x:x + width].copy()
+            if self._seq[0] == before:
+                return out
+
+    def close(self) -> None:
+        # Views must go before the mapping can be closed
+        del self._seq, self.frame
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
+
+
+class CaptureService:
+    """Thread in the supervisor that grabs the desktop into a SharedFrame every tick."""
+
+    def __init__(self, shared: SharedFrame, backend: Optional[CaptureBackend] = None,
+                 tick: float = DEFAULT_TICK) -> None:
+        self.shared = shared
+        self.backend = backend
+        self.tick = tick
+        self.grabs = 0
+        self.grab_seconds = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="capture-service", daemon=True)
+
+    def start(self) -> None:
+        if self.backend is None:
+            self.backend = screen.MssBackend()
+        self._grab()
+        self._thread.start()
+
+    def _grab(self) -> None:
+        start = time.perf_counter()
+        self.shared.write(self.backend.grab(self.shared.desktop))
+        self.grab_seconds += time.perf_counter() - start
+        self.grabs += 1
+
+    def _run(self) -> None:
+        due = time.monotonic()
+        while not self._stop.is_set():
+            due += self.tick
+            remaining = due - time.monotonic()
+            if remaining > 0:
+                self._stop.wait(remaining)
+            else:
+                # Fell behind; skip missed ticks rather than grabbing back to back
+                due = time.monotonic()
+            try:
+                self._grab()
+            except Exception as e:
+                print(f"Desktop capture failed: {e}")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=1)
+        if self.backend is not None:
+            self.backend.close()
+
+
+class SharedScreenBackend(CaptureBackend):
+    """Worker-side capture that reads slices of the supervisor's desktop grab."""
+
+    def __init__(self, shared: SharedFrame) -> None:
+        self.shared = shared
+
+    def grab(self, region: Region) -> np.ndarray:
+        return self.shared.read(region)
+
+
+class WindowCapture(CaptureBackend):
+    """Serves regions in 1920x1080 layout coordinates from one window of a larger desktop.
+
+    Scaled windows are resampled (nearest pixel) back to layout size, so
+    probes, OCR boxes and screen signatures work unchanged. window is a
+    Window or anything with the same screen_region/to_screen, such as a
+    calibrate.CalibratedWindow.
+    """
+
+    def __init__(self, inner: CaptureBackend, window: Window) -> None:
+        self.inner = inner
+        self.window = window
+        self._resample: Dict[Tuple[int, int, int, int], Tuple[np.ndarray, np.ndarray]] = {}
+
+    def grab(self, region: Region) -> np.ndarray:
+        frame = self.inner.grab(self.window.screen_region(region))
+        width, height = region[2], region[3]
+        if frame.shape[:2] == (height, width):
+            return frame
+        key = (width, height, frame.shape[1], frame.shape[0])
+        index = self._resample.get(key)
+        if index is None:
+            ys = np.minimum((np.arange(height) * frame.shape[0]) // height, frame.shape[0] - 1)
+            xs = np.minimum((np.arange(width) * frame.shape[1]) // width, frame.shape[1] - 1)
+            index = self._resample[key] = (ys[:, None], xs[None, :])
+        return frame[index]
+
+
+class WindowInput(InputBackend):
+    """Clicks in layout coordinates, translated into one window and serialised by a shared lock."""
+
+    name = "window"
+
+    def __init__(self, inner: InputBackend, window: Window, lock=None) -> None:
+        self.inner = inner
+        self.window = window
+        self.lock = lock
+        self.name = f"{inner.name} @ {window.left},{window.top} x{window.scale:g}"
+
+    def click(self, x: int, y: int) -> None:
+        sx, sy = self.window.to_screen(x, y)
+        if self.lock is None:
+            self.inner.click(sx, sy)
+            return
+        with self.lock:
+            self.inner.click(sx, sy)
+
+    def press_escape(self) -> None:
+        """Focus the window with a click, then press Escape in it, both under the lock."""
+        if not keyboard:
+            print("pynput not installed; cannot send Escape")
+            return
+        if self.lock is None:
+            self._focus_and_escape()
+            return
+        with self.lock:
+            self._focus_and_escape()
+
+    def _focus_and_escape(self) -> None:
+        self.inner.click(*self.window.to_screen(*FOCUS_POINT))
+        controller = keyboard.Controller()
+        controller.press(keyboard.Key.esc)
+        controller.release(keyboard.Key.esc)
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+# Set in each worker by _init_worker
+_worker_shared: Optional[SharedFrame] = None
+_worker_lock = None
+_worker_stop = None
+
+
+def _init_worker(shm_name: str, desktop: Region, lock, stop) -> None:
+    global _worker_shared, _worker_lock, _worker_stop
+    _worker_shared = SharedFrame(desktop, name=shm_name)
+    _worker_lock = lock
+    _worker_stop = stop
+
+
+def run_instance(spec: dict) -> dict:
+    """Worker entry point: run one script's main() inside its window until it stops."""
+    module = importlib.import_module(spec["script"])
+    if "calibrate" in spec:
+        from calibrate import CalibratedWindow
+        window = CalibratedWindow(spec["calibrate"], SharedScreenBackend(_worker_shared))
+        # Lets the script re-check the anchors when it stops recognising screens
+        module.WINDOW = window
+    else:
+        window = Window(*spec.get("origin", (0, 0)), spec.get("scale", 1.0))
+    for key, value in spec.get("set", {}).items():
+        setattr(module, key, value)
+    # The supervisor owns the quit key; input() answers the script's prompts
+    module.keyboard = None
+    if "target" in spec:
+        module.input = lambda *args: str(spec["target"])
+
+    screen.set_backend(WindowCapture(SharedScreenBackend(_worker_shared), window))
+    window_input = WindowInput(input_backend.default_backend(), window, _worker_lock)
+    injector = input_backend.set_backend(window_input)
+    # Escape must reach this instance's window, not whichever has focus
+    module.recover_to_home = window_input.press_escape
+
+    def watch_stop() -> None:
+        _worker_stop.wait()
+        module.running = False
+
+    threading.Thread(target=watch_stop, name="stop-watch", daemon=True).start()
+    exit_code = None
+    try:
+        module.main()
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else 0
+    return {"script": spec["script"], "window": {"left": window.left, "top": window.top, "scale": window.scale},
+            "exit_code": exit_code,
+            "clicks": injector.stats(), "capture": {"hits": screen.get_engine().hits,
+                                                    "misses": screen.get_engine().misses}}
+
+
+def desktop_region() -> Region:
+    """Bounding box of every monitor, from mss."""
+    import mss
+    with mss.mss() as sct:
+        mon = sct.monitors[0]
+    return mon["left"], mon["top"], mon["width"], mon["height"]
+
+
+def supervise(instances: List[dict], desktop: Optional[Region] = None, tick: float = DEFAULT_TICK,
+              backend: Optional[CaptureBackend] = None) -> List[dict]:
+    """Run every instance spec in its own worker process and return their summaries."""
+    desktop = tuple(desktop) if desktop is not None else desktop_region()
+    shared = SharedFrame(desktop)
+    service = CaptureService(shared, backend, tick)
+    # Spawn, as on Windows: forking now would copy the running capture and
+    # listener threads into every worker
+    ctx = multiprocessing.get_context("spawn")
+    lock = ctx.Lock()
+    stop = ctx.Event()
+    listener = None
+
+    def on_press(key):
+        if getattr(key, "char", None) == "q":
+            print("Stopping all instances.")
+            stop.set()
+            return False
+
+    try:
+        listener = keyboard.Listener(on_press=on_press)
+        listener.start()
+    except Exception:
+        # No pynput or no display; stop with Ctrl+C instead
+        listener = None
+
+    service.start()
+    results = []
+    try:
+        with ProcessPoolExecutor(max_workers=len(instances), mp_context=ctx, initializer=_init_worker,
+                                 initargs=(shared.name, desktop, lock, stop)) as pool:
+            futures = [pool.submit(run_instance, spec) for spec in instances]
+            for spec, future in zip(instances, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    print(f"{spec['script']} worker failed: {e}")
+                    results.append({"script": spec["script"], "error": str(e)})
+    except KeyboardInterrupt:
+        stop.set()
+    finally:
+        service.stop()
+        if listener is not None:
+            listener.stop()
+        if service.grabs:
+            print(f"Desktop grabs: {service.grabs}, mean {service.grab_seconds / service.grabs * 1000:.1f} ms")
+        shared.close()
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("config", help="JSON file listing the instances")
+    args = parser.parse_args()
+    with open(args.config) as f:
+        config = json.load(f)
+    results = supervise(config["instances"], config.get("desktop"), config.get("tick", DEFAULT_TICK))
+    for result in results:
+        print(json.dumps(result))
+    return 0 if all("error" not in r for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""Headless checks: the bots end to end on the simulator, plus the pieces
+they lean on (plans, the trophy estimator, probes, OCR cache, scheduler).
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import simulator  # noqa: E402
+from attack_plan import AttackPlan, execute, load_plan  # noqa: E402
+from ocr import OcrCache  # noqa: E402
+from scheduler import DeadlineScheduler  # noqa: E402
+from screen import CaptureEngine, Probe, ProbeSet, SyntheticBackend, rgb_frame  # noqa: E402
+from trophy_estimator import TrophyEstimator  # noqa: E402
+
+
+# Simulated runs
+
+@pytest.mark.parametrize("script", ["EDragSpammer", "ValkSpammer", "TrophyDropper"])
+def test_script_completes_cycles(script):
+    result = simulator.run_script(script, cycles=2)
+    assert result.cycles >= 2
+    assert result.clicks > 0
+
+
+def test_valk_surrenders_on_one_star():
+    result = simulator.run_script("ValkSpammer", cycles=2, one_star_chance=1.0)
+    assert result.cycles >= 2
+
+
+# Attack plans
+
+@pytest.mark.parametrize("name", ["edrag.json", "valk.json"])
+def test_shipped_plans_load(name):
+    plan = load_plan(os.path.join(ROOT, "plans", name))
+    for variant in plan.variants:
+        assert plan.realise(np.random.default_rng(0), variant)
+
+
+def _plan(*steps, **extra):
+    return {"phases": [{"name": "p", "steps": list(steps)}], **extra}
+
+
+@pytest.mark.parametrize("spec", [
+    [],
+    {"phases": []},
+    {"phases": [1]},
+    {"phases": [{"name": "p", "stpes": []}]},
+    {"phases": [{"name": "p", "steps": {}}]},
+    _plan("click"),
+    _plan({}),
+    _plan({"click": [1, 2], "dealy": [1, 2]}),
+    _plan({"click": [1, 2], "repat": 3}),
+    _plan({"click": [1, 2], "repeat": 0}),
+    _plan({"click": [[5, 1], 2]}),
+    _plan({"click": [1, 2], "delay": [True, 2]}),
+    _plan({"line": {"from": [1, 2], "to": [3, 4]}}),
+    _plan({"click": {"a": [1, 2]}}, variants=["a", "b"]),
+    _plan({"click": [1, 2]}, variants=["a", "a"]),
+])
+def test_malformed_plans_raise_value_error(spec):
+    with pytest.raises(ValueError):
+        AttackPlan(spec)
+
+
+def test_line_spans_its_end_points():
+    plan = AttackPlan(_plan({"line": {"from": [0, 0], "to": [100, 50], "count": 3}, "delay": 0}))
+    steps = plan.realise(np.random.default_rng(0))
+    assert [(s.x, s.y) for s in steps] == [(0, 0), (50, 25), (100, 50)]
+
+
+def test_execute_sends_bursts_together():
+    plan = AttackPlan(_plan({"click": [1, 2], "delay": 0, "repeat": 3, "repeat_delay": 0, "burst": True}))
+    clicks, bursts = [], []
+    execute(plan.realise(np.random.default_rng(0)), lambda x, y: clicks.append((x, y)),
+            sleep=lambda s: None, burst=lambda points, intervals: bursts.append(points))
+    assert clicks == [] and bursts == [[(1, 2)] * 3]
+
+
+# Trophy estimator
+
+def test_estimator_reads_until_first_observation():
+    est = TrophyEstimator((5, 20), ocr_every=10)
+    assert est.needs_read(1000)
+    est.observe(2000)
+    assert not est.needs_read(1000)
+    assert est.skipped == 1
+
+
+def test_estimator_range_tracks_losses():
+    est = TrophyEstimator((5, 20))
+    est.record_loss()  # before any read: only counted
+    assert est.low is None and est.battles_since_read == 1
+    est.observe(1000)
+    est.record_loss()
+    est.record_loss()
+    assert (est.low, est.high, est.estimate) == (960, 990, 975)
+
+
+def test_estimator_reads_when_range_reaches_target():
+    est = TrophyEstimator((5, 20))
+    est.observe(1020)
+    assert not est.needs_read(1000)
+    est.record_loss()
+    assert not est.needs_read(1000)  # low is exactly 1000
+    est.record_loss()
+    assert est.needs_read(1000)
+
+
+def test_estimator_reads_after_ocr_every_battles():
+    est = TrophyEstimator((0, 0), ocr_every=3)
+    est.observe(5000)
+    for _ in range(3):
+        assert not est.needs_read(0)
+        est.record_loss()
+    assert est.needs_read(0)
+
+
+def test_estimator_widens_on_surprise_reads():
+    est = TrophyEstimator((5, 20))
+    est.observe(1000)
+    est.record_loss()
+    est.record_loss()
+    est.observe(940)  # 30 a battle, above the model
+    assert est.loss == (5, 30)
+    est.record_loss()
+    est.observe(945)  # a gain: the minimum loss floors at zero
+    assert est.loss == (0, 30)
+    assert (est.low, est.high) == (945, 945)
+
+
+def test_estimator_rejects_bad_loss_range():
+    with pytest.raises(ValueError):
+        TrophyEstimator((20, 5))
+    with pytest.raises(ValueError):
+        TrophyEstimator((-1, 5))
+
+
+# Probes
+
+def _engine(frame):
+    return CaptureEngine(SyntheticBackend(frame), ttl=0)
+
+
+def test_probe_tolerance_metrics():
+    frame = rgb_frame(100, 100, (100, 100, 100))
+    probes = ProbeSet({
+        "exact": Probe((10, 10), (100, 100, 100)),
+        "channel": Probe((10, 10), (110, 95, 100), tolerance=10),
+        "channel_off": Probe((10, 10), (111, 100, 100), tolerance=10),
+        # sqrt(3 * 6^2) ~ 10.4 is over 10, though every channel is within it
+        "euclidean_off": Probe((10, 10), (106, 106, 106), tolerance=10, metric="euclidean"),
+        "absent": Probe((10, 10), (0, 0, 0), present=False),
+    }, _engine(frame))
+    assert probes.fired() == ["exact", "channel", "absent"]
+
+
+def test_probe_patch_averages():
+    frame = rgb_frame(100, 100)
+    frame[49:52, 49:52] = (90, 90, 90, 255)
+    frame[50, 50] = (180, 180, 180, 255)
+    probes = ProbeSet({"centre": Probe((50, 50), (100, 100, 100), patch=1)}, _engine(frame))
+    assert probes.evaluate().all()
+
+
+def test_sparse_probes_match_a_full_frame():
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (1080, 1920, 4), dtype=np.uint8)
+    points = [(5, 5), (1900, 20), (960, 540), (30, 1070)]
+    probes = ProbeSet({str(p): Probe(p, tuple(int(v) for v in frame[p[1], p[0], 2::-1])) for p in points},
+                      _engine(frame))
+    assert probes.sparse
+    assert probes.evaluate().all()
+    left, top, width, height = probes.region
+    np.testing.assert_array_equal(probes.colors(), probes.colors(frame[top:top + height, left:left + width]))
+
+
+# OCR cache
+
+def test_ocr_cache_hits_identical_pixels_and_skips_failures():
+    cache = OcrCache(maxsize=2)
+    calls = []
+
+    def read(value):
+        def compute():
+            calls.append(value)
+            return value
+        return compute
+
+    a, b, c = (rgb_frame(4, 4, (v, 0, 0)) for v in (1, 2, 3))
+    assert cache.lookup(a, 4, read(1)) == 1
+    assert cache.lookup(a.copy(), 4, read(99)) == 1
+    assert cache.lookup(a, 3, read(7)) == 7  # digit count is part of the key
+    assert cache.lookup(b, 4, read(None)) is None
+    assert cache.lookup(b, 4, read(2)) == 2  # the failure was not stored
+    assert cache.lookup(c, 4, read(3)) == 3  # evicts (a, 4), least recently used
+    assert cache.lookup(a, 4, read(11)) == 11
+    assert calls == [1, 7, None, 2, 3, 11]
+
+
+# Scheduler
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_scheduler_absorbs_action_cost():
+    clock = FakeClock()
+    scheduler = DeadlineScheduler(clock, clock.sleep)
+    scheduler.start()
+    for _ in range(4):
+        assert scheduler.wait(1.0, "step") == 0.0
+        clock.now += 0.3  # the action itself
+    assert clock.now == pytest.approx(4.3)
+
+
+def test_scheduler_reports_lateness():
+    clock = FakeClock()
+    scheduler = DeadlineScheduler(clock, clock.sleep)
+    scheduler.start()
+    clock.now += 1.5
+    assert scheduler.wait(1.0, "slow") == pytest.approx(0.5)
+    assert scheduler.wait(1.0, "fast") == 0.0
+    summary = scheduler.summary()
+    assert summary["slow"]["max_ms"] == pytest.approx(500)
+    assert summary["total"]["planned_s"] == pytest.approx(2.0)
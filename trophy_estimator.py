@@ -0,0 +1,76 @@
+"""Trophy count tracked between OCR reads.
+
+Every surrender costs a roughly predictable number of trophies, so after
+one OCR read the count can be carried forward as a range: each recorded
+loss lowers the bottom by the largest expected loss and the top by the
+smallest. The bot only needs a fresh read when the bottom of the range
+reaches the target (it might be under it now) or after ocr_every battles
+without one, to stop drift. Reads that land outside the carried range
+widen the loss model, so a bad guess corrects itself.
+"""
+import math
+import threading
+from typing import Dict, Optional, Tuple
+
+
+class TrophyEstimator:
+    """Lower and upper bound on the trophy count, advanced per battle."""
+
+    def __init__(self, loss: Tuple[int, int] = (5, 20), ocr_every: int = 10) -> None:
+        if not 0 <= loss[0] <= loss[1]:
+            raise ValueError(f"loss range must be 0 <= min <= max, got {loss}")
+        self.loss = loss
+        self.ocr_every = ocr_every
+        self.low: Optional[int] = None
+        self.high: Optional[int] = None
+        self.battles_since_read = 0
+        self.reads = 0
+        self.skipped = 0
+        self._last_read: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def estimate(self) -> Optional[int]:
+        """Middle of the range, for logging."""
+        if self.low is None:
+            return None
+        return (self.low + self.high) // 2
+
+    def needs_read(self, target: int) -> bool:
+        """Whether the count has to be read before the next battle.
+
+        True before the first read, after ocr_every battles without one, and
+        whenever the bottom of the range is under target. Otherwise the
+        count is certainly not under target and the read is skipped.
+        """
+        with self._lock:
+            needed = (self.low is None or self.battles_since_read >= self.ocr_every or self.low < target)
+            if not needed:
+                self.skipped += 1
+            return needed
+
+    def observe(self, value: int) -> None:
+        """Reset the range to an OCR reading, widening the loss model if it fell outside."""
+        with self._lock:
+            k = self.battles_since_read
+            if self._last_read is not None and k and not self.low <= value <= self.high:
+                per_battle = (self._last_read - value) / k
+                self.loss = (min(self.loss[0], max(math.floor(per_battle), 0)),
+                             max(self.loss[1], math.ceil(per_battle)))
+                print(f"Trophy read {value} outside estimate {self.low}-{self.high}; loss model now {self.loss}")
+            self.low = self.high = value
+            self._last_read = value
+            self.battles_since_read = 0
+            self.reads += 1
+
+    def record_loss(self) -> None:
+        """One battle lost (surrendered) since the last update."""
+        with self._lock:
+            self.battles_since_read += 1
+            if self.low is not None:
+                self.low -= self.loss[1]
+                self.high -= self.loss[0]
+
+    def stats(self) -> Dict[str, object]:
+        return {"estimate": self.estimate, "low": self.low, "high": self.high, "reads": self.reads,
+                "skipped": self.skipped, "loss": self.loss}
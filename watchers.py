@@ -0,0 +1,176 @@
+"""Screen watchers that run side by side on asyncio.
+
+A FrameStream grabs one region per tick and hands the same frame to
+every watcher awaiting it; screen_stream() grabs only what a screen
+classifier reads (its sentinel pixels until signatures are built). Watchers are coroutines that return a value
+when their condition shows up; first() runs several of them and returns
+the one that fires first, cancelling the rest. Another condition (a
+pop-up, a time limit) is one more coroutine reading frames that are
+grabbed anyway, so it adds no capture latency.
+
+    async def battle_end():
+        async with screen_stream(SCREENS) as stream:
+            return await first({
+                "one_star": screen_state(stream, SCREENS, ("one_star",)),
+                "results": screen_state(stream, SCREENS, ("results",)),
+            }, stream, timeout=240)
+
+    fired = run(battle_end())
+"""
+import asyncio
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from screen import CaptureEngine, Region, get_engine
+from screen_state import UNKNOWN, Detection, ScreenClassifier
+
+# Default time between grabs, seconds
+DEFAULT_INTERVAL = 0.25
+
+# Pause between grabs, looked up per tick so the simulator can swap in a
+# virtual-clock sleep alongside this module's time
+sleep = asyncio.sleep
+
+
+class FrameStream:
+    """The latest grab of region, refreshed every interval and shared by all subscribers.
+
+    grab, if given, is called instead of grabbing region and the stream
+    carries whatever it returns. Use as an async context manager inside a
+    running loop; the grab task stops when the block exits.
+    """
+
+    def __init__(self, region: Region, interval: float = DEFAULT_INTERVAL,
+                 engine: Optional[CaptureEngine] = None, grab: Optional[Callable[[], Any]] = None) -> None:
+        self.region = region
+        self.interval = interval
+        self.engine = engine
+        self.grab = grab
+        self.frame: Optional[np.ndarray] = None
+        self.sequence = 0
+        self.grabbed_at = 0.0
+        self._changed: Optional[asyncio.Condition] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "FrameStream":
+        self._changed = asyncio.Condition()
+        await self._grab()
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def _grab(self) -> None:
+        self.frame = self.grab() if self.grab is not None else (self.engine or get_engine()).grab(self.region)
+        self.grabbed_at = time.monotonic()
+        self.sequence += 1
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _run(self) -> None:
+        while True:
+            await sleep(self.interval)
+            await self._grab()
+
+    async def next(self, seen: int = 0) -> Tuple[int, np.ndarray]:
+        """(sequence, frame) of the first grab newer than sequence seen."""
+        if self.sequence <= seen:
+            async with self._changed:
+                await self._changed.wait_for(lambda: self.sequence > seen)
+        return self.sequence, self.frame
+
+    async def __aiter__(self) -> AsyncIterator[np.ndarray]:
+        seen = 0
+        while True:
+            seen, frame = await self.next(seen)
+            yield frame
+
+    def crop(self, frame: np.ndarray, region: Region) -> np.ndarray:
+        """View of region (screen coordinates) inside a frame of this stream."""
+        left, top, width, height = region
+        x, y = left - self.region[0], top - self.region[1]
+        if x < 0 or y < 0 or x + width > self.region[2] or y + height > self.region[3]:
+            raise ValueError(f"Region {region} is outside the stream's {self.region}")
+        return frame[y:y + height, x:x + width]
+
+
+def screen_stream(classifier: ScreenClassifier, interval: float = DEFAULT_INTERVAL) -> FrameStream:
+    """Stream of classifier.sample(), for screen_state watchers on that classifier only."""
+    return FrameStream(classifier.region, interval, classifier.engine, grab=classifier.sample)
+
+
+async def until(stream: FrameStream, check: Callable[[np.ndarray], Any]) -> Any:
+    """Value of check(frame) for the first frame on which it is truthy."""
+    async for frame in stream:
+        value = check(frame)
+        if value:
+            return value
+
+
+async def screen_state(stream: FrameStream, classifier: ScreenClassifier, states: Optional[Iterable[str]] = None,
+                       exclude: Iterable[str] = ()) -> Detection:
+    """Detection once one of states (any known state if None, never one in exclude) shows.
+
+    stream is either classifier's own screen_stream() or frames covering classifier.region.
+    """
+    wanted = set(states) if states is not None else None
+    skip = set(exclude) | {UNKNOWN}
+    sampled = stream.grab == classifier.sample
+
+    def check(frame: np.ndarray) -> Optional[Detection]:
+        found = (classifier.classify_sample(frame) if sampled
+                 else classifier.classify(stream.crop(frame, classifier.region)))
+        if found.state not in skip and (wanted is None or found.state in wanted):
+            return found
+        return None
+
+    return await until(stream, check)
+
+
+async def elapsed(stream: FrameStream, seconds: float) -> float:
+    """Time limit: fires on the first frame grabbed seconds or more from now."""
+    deadline = time.monotonic() + seconds
+    return await until(stream, lambda frame: stream.grabbed_at >= deadline and stream.grabbed_at)
+
+
+class Fired(NamedTuple):
+    """The watcher that fired first, what it returned and how long it took."""
+    name: str
+    value: Any
+    elapsed: float
+
+
+async def first(watchers: Dict[str, Awaitable], stream: Optional[FrameStream] = None,
+                timeout: Optional[float] = None) -> Fired:
+    """Run watchers together and return the first to finish; the others are cancelled.
+
+    timeout adds a watcher named "timeout" timed on stream's grabs. An
+    exception from a watcher propagates once the others are cancelled.
+    """
+    start = time.monotonic()
+    if timeout is not None:
+        if stream is None:
+            raise ValueError("timeout needs the stream to time it against")
+        watchers = {**watchers, "timeout": elapsed(stream, timeout)}
+    tasks = {asyncio.ensure_future(w): name for name, w in watchers.items()}
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    # Several can finish on the same frame; the earliest listed wins
+    winner = next(task for task in tasks if task in done)
+    return Fired(tasks[winner], winner.result(), time.monotonic() - start)
+
+
+def run(coro: Awaitable) -> Any:
+    """Run a watcher coroutine to completion from blocking code."""
+    return asyncio.run(coro)